@@ -13,6 +13,8 @@ def main():
     parser = argparse.ArgumentParser(description="Extract user questions from Langfuse data.")
     parser.add_argument("--days", type=int, default=7,
                         help="Number of past days to process Langfuse data for. Defaults to 7.")
+    parser.add_argument("--compress", action="store_true",
+                        help="Write the extracted user inputs as a gzip-compressed CSV.")
     args = parser.parse_args()
 
     print("\n" + "="*60)
@@ -26,7 +28,7 @@ def main():
         traces_csv, observations_csv = download_langfuse_data(langfuse_folder, days=args.days)
 
         print(">>> Processing Langfuse data to extract user inputs...")
-        user_inputs_file = process_langfuse_data(traces_csv, observations_csv, langfuse_folder)
+        user_inputs_file = process_langfuse_data(traces_csv, observations_csv, langfuse_folder, compress=args.compress)
 
         print("\n[SUCCESS] Langfuse data extraction completed!")
         print(f"   >> Langfuse folder: {os.path.relpath(langfuse_folder, start=os.getcwd())}")
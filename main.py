@@ -49,6 +49,7 @@ def main():
         "files_skipped_due_to_no_change": 0,
         "files_processed": 0,
         "documents_sent_to_llamaparse": 0,
+        "documents_markdown_bypassed": 0,
         "documents_empty_from_llamaparse": 0,
         "documents_successful_after_retries": 0,
         "documents_failed_after_retries": 0,
@@ -135,6 +136,9 @@ Number of files that were processed (either new or changed).
 => documents_sent_to_llamaparse: {stats.get("documents_sent_to_llamaparse", "N/A")}
 Number of files sent to LlamaParse for conversion to markdown.
 
+=> documents_markdown_bypassed: {stats.get("documents_markdown_bypassed", "N/A")}
+Number of HTML files that were already markdown and skipped LlamaParse.
+
 => total_pdfs_attempted: {stats.get("total_pdfs_attempted", "N/A")}
 Total number of PDF files that were attempted to be parsed.
 
@@ -149,6 +153,7 @@ Number of times LlamaParse returned empty content (likely due to unsupported, bl
 
 => documents_successful_after_retries: {stats.get("documents_successful_after_retries", "N/A")}
 Number of files that were rescued by retry logic after LlamaParse failed.
+Includes the documents_markdown_bypassed files, so with documents_failed_after_retries it accounts for every file parsed.
 
 => documents_failed_after_retries: {stats.get("documents_failed_after_retries", "N/A")}
 Number of files that failed to produce content even after all retry attempts.
@@ -69,6 +69,9 @@ def analyze_file_changes(output_data_path, last_output_data_path, out_folder, la
         return pd.DataFrame()  # Return empty DataFrame
 
     current_df = pd.read_csv(output_data_path)
+    # Rows for content another URL already has (SKIPPED_DUPLICATE in the crawl log) have a hash but no
+    # Filepath; that URL's row covers the file, so they are neither copied, removed nor parsed
+    current_df = current_df[~(current_df["Filepath"].isna() & current_df["Content Hash"].notna())]
 
     # Separate HTML and PDF files
     html_df = current_df[current_df["Content Type"] == "html"]
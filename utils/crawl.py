@@ -1,92 +1,217 @@
 import asyncio
+import codecs
+import contextlib
 import datetime
 import hashlib
-import json
+import html
+import operator
 import os
-import time
-import zlib
+import re
+from urllib.parse import urlparse
 
+import aiohttp
 import nest_asyncio
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
 from playwright.async_api import async_playwright
 
-from utils.tools import create_folder
+from utils.tools import DetailedLogger, create_folder
 
 nest_asyncio.apply()
 
+# C-backed parser used for every BeautifulSoup parse in the crawler
+HTML_PARSER = "lxml"
+
+# Only build the subtree we keep from pages with a known layout. The class is matched with a
+# regex because the strainer sees the raw attribute string, which may hold several classes.
+WRAPPER_BODY_STRAINER = SoupStrainer("div", class_=re.compile(r"(?:^|\s)wrapper-body(?:\s|$)"))
+MAIN_CONTENT_STRAINER = SoupStrainer("article", class_=re.compile(r"(?:^|\s)main-content(?:\s|$)"))
+
+# Number of rows fetched concurrently and the per-request timeout. Only connecting and each read
+# are limited, so a large file may take as long as it needs to stream while data keeps arriving.
+MAX_CONCURRENT_REQUESTS = 20
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=10)
+
+# Columns of the crawl output CSV
+OUTPUT_COLUMNS = [
+    "Heading",
+    "Subheading",
+    "Title",
+    "URL",
+    "Filepath",
+    "Content Type",
+    "Content Hash",
+    "Last Update",
+    "Role",
+]
+
+# URLs that are never crawled, either by exact match or by host suffix
+SKIP_HOSTS = frozenset({"sharepoint.com"})
+SKIP_URLS = frozenset({"https://www.byupathway.edu/pathwayconnect-block-academic-calendar"})
+
+
+def hash_file(path, chunk=1 << 20):
+    """Generate a SHA-256 hash of a file, reading it in chunks."""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
 
 def generate_content_hash(content):
-    """Generate a SHA-256 hash of the content."""
+    """Generate a SHA-256 hash of the content, given as bytes or a file path."""
+    if isinstance(content, (str, os.PathLike)):
+        return hash_file(content)
     return hashlib.sha256(content).hexdigest()
 
 
-def generate_hash_filename(url):
-    """Generate a hash of the URL to use as a filename."""
-    url_hash = zlib.crc32(url.encode())
-    file_name = f"{url_hash:x}"
-    return file_name
+async def stream_to_file(response, filepath, chunk_size=65536):
+    """Write a response body to a file chunk by chunk and return its SHA-256 hash."""
+    h = hashlib.sha256()
+    f = await asyncio.to_thread(open, filepath, "wb")
+    try:
+        async for chunk in response.content.iter_chunked(chunk_size):
+            h.update(chunk)
+            await asyncio.to_thread(f.write, chunk)
+    finally:
+        await asyncio.to_thread(f.close)
+    return h.hexdigest()
+
+
+def write_file(filepath, content):
+    """Write text or bytes content to a file."""
+    if isinstance(content, bytes):
+        with open(filepath, "wb") as f:
+            f.write(content)
+    else:
+        with open(filepath, "w", encoding="utf-8") as f:
+            f.write(content)
+
+
+def load_content_hashes(csv_path):
+    """Map each content hash recorded with a file in a previous crawl output to the URL that owned it."""
+    if not os.path.exists(csv_path):
+        return {}
+    df = pd.read_csv(csv_path, usecols=["URL", "Filepath", "Content Hash"]).dropna()
+    return dict(zip(df["Content Hash"], df["URL"]))
+
+
+def to_utf8(raw, encoding):
+    """Return a response body as UTF-8 bytes, transcoding only when it uses another charset."""
+    if codecs.lookup(encoding).name == "utf-8":
+        try:
+            raw.decode("utf-8")  # validate only; valid bodies are written as received
+            return raw
+        except UnicodeDecodeError:
+            pass
+    return raw.decode(encoding, errors="replace").encode("utf-8")
+
+
+def list_filenames(directory):
+    """Return the names of the files directly inside a directory."""
+    with os.scandir(directory) as entries:
+        return {entry.name for entry in entries if entry.is_file()}
+
+
+def should_skip_url(url):
+    """Check whether a URL is excluded from crawling."""
+    if url in SKIP_URLS:
+        return True
+    host = urlparse(url).netloc.lower()
+    return any(host == skip_host or host.endswith(f".{skip_host}") for skip_host in SKIP_HOSTS)
+
+
+class PlaywrightPool:
+    """Lazily started Playwright browser shared by every crawl fetch that needs one."""
+
+    def __init__(self, headless=True, navigation_timeout=10_000):
+        self.headless = headless
+        self.navigation_timeout = navigation_timeout
+        self._playwright = None
+        self._browser = None
+        self._lock = asyncio.Lock()
+
+    async def _get_browser(self):
+        async with self._lock:
+            if self._browser is None:
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=self.headless)
+        return self._browser
+
+    @contextlib.asynccontextmanager
+    async def page(self):
+        """Yield a page in a fresh browser context, closing the context afterwards."""
+        browser = await self._get_browser()
+        context = await browser.new_context()
+        try:
+            page = await context.new_page()
+            page.set_default_navigation_timeout(self.navigation_timeout)
+            yield page
+        finally:
+            await context.close()
+
+    async def close(self):
+        """Close the browser and stop Playwright if they were started."""
+        async with self._lock:
+            if self._browser is not None:
+                await self._browser.close()
+            if self._playwright is not None:
+                await self._playwright.stop()
+            self._browser = None
+            self._playwright = None
+
+
+playwright_pool = PlaywrightPool()
 
 
 # whatsapp function
 async def get_whatsapp_content(url):
-    playwright = await async_playwright().start()
-    browser = await playwright.chromium.launch(headless=False)
-    page = await browser.new_page()
-
     post_xpath = "/html/body/div[1]/div/div/div/div[2]/div/div/div[1]/div[1]/div[2]/div[2]/div/div/div[1]/div/div/div/div/div/div/div"
 
     print(url)
-    await page.goto(url)
-    await page.wait_for_load_state()
-    post = await page.query_selector(f"xpath={post_xpath}")
-    post_content = await post.inner_html()
-    await browser.close()
-    if post:
-        return post_content
-    else:
-        print(f"Error with {url}")
-        return None
+    async with playwright_pool.page() as page:
+        try:
+            await page.goto(url, wait_until="domcontentloaded", timeout=15_000)
+            # return as soon as the post node exists instead of waiting for the full load
+            post = await page.wait_for_selector(f"xpath={post_xpath}", timeout=15_000)
+        except PlaywrightTimeoutError:
+            post = None
+        if post:
+            return await post.inner_html()
+    print(f"Error with {url}")
+    return None
 
 
 async def fetch_content_with_playwright(url, filepath):
     """Fetch the content of a URL using Playwright and save it to a file."""
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(headless=True)
-        page = await browser.new_page()
+    async with playwright_pool.page() as page:
         try:
-            await page.goto(url, timeout=60000)  # 60 seconds timeout
-            time.sleep(5)
+            await page.goto(url, wait_until="domcontentloaded", timeout=15_000)
+            await page.wait_for_selector("body", timeout=5_000)
             content = await page.content()
-            with open(filepath, "w", encoding="utf-8") as f:
-                f.write(content)
+            await asyncio.to_thread(write_file, filepath, content)
         except Exception as e:
             print(f"Error loading {url}: {e}")
-        await browser.close()
 
 
 async def fetch_content_from_student_services(urls):
     """Fetch content from student services page with tabs"""
-    plw = await async_playwright().start()
-    brwsr = await plw.chromium.launch()
-    pg = await brwsr.new_page()
     content = ""
-    for url in urls:
-        print("crawling subpage: ", url["url"])
-        await pg.goto(url["url"])
-        await pg.wait_for_load_state()
-        cntnt = await pg.content()
-        soup = BeautifulSoup(cntnt, "html.parser")
-        art = soup.find("article", class_="main-content").prettify()
-        # crete an h1 tag with the title and addit to the art as the first child of the article
-
-        h1 = soup.new_tag("h1")
-        h1.string = url["title"]
-        art = art.replace(">", f">{h1}", 1)
-        content += art
-
-    await brwsr.close()
+    async with playwright_pool.page() as pg:
+        for url in urls:
+            print("crawling subpage: ", url["url"])
+            await pg.goto(url["url"], wait_until="domcontentloaded", timeout=15_000)
+            await pg.wait_for_selector("article.main-content", timeout=5_000)
+            cntnt = await pg.content()
+            soup = BeautifulSoup(cntnt, HTML_PARSER, parse_only=MAIN_CONTENT_STRAINER)
+            art = soup.find("article", class_="main-content").decode()
+            # create an h1 with the title and add it to the art as the first child of the article
+            h1 = f"<h1>{html.escape(url['title'], quote=False)}</h1>"
+            art = art.replace(">", f">{h1}", 1)
+            content += art
+
     return content
 
 
@@ -104,10 +229,60 @@ async def crawl_csv(df, base_dir, output_file="output_data.csv", detailed_log_pa
     create_folder(crawl_path, "html")
     create_folder(crawl_path, "pdf")
     create_folder(crawl_path, "others")
+    html_dir = os.path.join(crawl_path, "html")
+    pdf_dir = os.path.join(crawl_path, "pdf")
 
-    output_data = []
+    # List already crawled files once instead of checking each row on disk
+    existing_html = list_filenames(html_dir)
+    existing_pdf = list_filenames(pdf_dir)
 
-    async def process_row(row):  # noqa: C901
+    # One list per output column, filled row by row and turned into a DataFrame at the end
+    output_data = {column: [] for column in OUTPUT_COLUMNS}
+
+    def add_output_row(*values):
+        """Append one crawled row, given in OUTPUT_COLUMNS order."""
+        for column, value in zip(OUTPUT_COLUMNS, values):
+            output_data[column].append(value)
+
+    # Content hashes owned by a URL in the previous crawl
+    out_path = os.path.join(base_dir, output_file)
+    previous_owners = load_content_hashes(out_path)
+
+    # Fetched rows as (input position, output row values, log entry), recorded once all rows are done
+    fetched = []
+
+    def record_fetched_rows():
+        """
+        Add the output rows and log entries of the fetched rows, keeping one file per content hash.
+
+        A hash is owned by the URL that owned it in the previous crawl when that URL was fetched again,
+        otherwise by its first row in input order, so the owner does not depend on which fetch finished
+        first. Rows of other URLs with the same content keep their row with no Filepath of their own,
+        and their copy of the file is removed.
+        """
+        fetched.sort(key=operator.itemgetter(0))
+        owners = {}
+        for _, values, _ in fetched:
+            url, filepath, content_hash = values[3], values[4], values[6]
+            owner = owners.get(content_hash)
+            if owner is None or (url == previous_owners.get(content_hash) and owner[0] != url):
+                owners[content_hash] = (url, filepath)
+
+        for _, values, log_entry in fetched:
+            url, filepath, content_hash = values[3], values[4], values[6]
+            owner_url, owner_filepath = owners[content_hash]
+            if url != owner_url:
+                if filepath != owner_filepath and os.path.exists(filepath):
+                    os.remove(filepath)
+                values[4] = None
+                log_entry["status"] = "SKIPPED_DUPLICATE"
+                log_entry["reason"] = f"Same content as {owner_url}"
+                log_entry["filepath"] = None
+                print(f"Duplicate content for {url} (same as {owner_url}). Skipping save.")
+            add_output_row(*values)
+            log(log_entry)
+
+    async def process_row(session, order, row):  # noqa: C901
         url = row["URL"]
         if "student-services.catalog.prod.coursedog.com" in url:
             url = url.replace("student-services.catalog.prod.coursedog.com", "studentservices.byupathway.edu")
@@ -117,28 +292,27 @@ async def crawl_csv(df, base_dir, output_file="output_data.csv", detailed_log_pa
         filename = row["filename"]
         role = row["Role"]
 
-        if "sharepoint.com" in url or url == "https://www.byupathway.edu/pathwayconnect-block-academic-calendar":
+        if should_skip_url(url):
             return
 
         # Edit the title to become filename
 
         # Determine the filepaths
-        html_filepath = os.path.join(crawl_path, "html", f"{filename}.html")
-        pdf_filepath = os.path.join(crawl_path, "pdf", f"{filename}.pdf")
+        html_filename = f"{filename}.html"
+        html_filepath = os.path.join(html_dir, html_filename)
+        pdf_filename = f"{filename}.pdf"
+        pdf_filepath = os.path.join(pdf_dir, pdf_filename)
 
         # Skip fetching if the file already exists
-        if os.path.exists(html_filepath) or os.path.exists(pdf_filepath):
+        if html_filename in existing_html or pdf_filename in existing_pdf:
             log_entry = {
-                "timestamp": datetime.datetime.now().isoformat(),
                 "stage": "crawl",
                 "url": url,
                 "status": "SKIPPED",
                 "reason": "File already exists",
-                "filepath": html_filepath if os.path.exists(html_filepath) else pdf_filepath,
+                "filepath": html_filepath if html_filename in existing_html else pdf_filepath,
             }
-            if detailed_log_path:
-                with open(detailed_log_path, "a") as f:
-                    f.write(json.dumps(log_entry) + "\n")
+            log(log_entry)
             print(f"File already exists for {filename}. Skipping fetch.")
             return
 
@@ -147,137 +321,130 @@ async def crawl_csv(df, base_dir, output_file="output_data.csv", detailed_log_pa
         print("Working on ", url)
         while retry_attempts > 0:
             try:
-                time.sleep(3)
-                response = requests.get(url, timeout=10)
-                response.raise_for_status()  # http errors
-                content_type = response.headers.get("content-type", "")
-
-                log_status = "SUCCESS"
-                log_reason = f"Content Type: {content_type}"
-                log_filepath = ""
-
-                if any(domain in url for domain in ["faq.whatsapp"]):
-                    content = await get_whatsapp_content(url)
-                    filepath = html_filepath
-                    with open(filepath, "w", encoding="utf-8") as f:
-                        f.write(content)
-                    content = content.encode("utf-8")
-                    log_filepath = filepath
-                elif any(
-                    domain in url
-                    for domain in [
-                        "articulate.com",
-                        "myinstitute.churchofjesuschrist.org",
-                    ]
-                ):
-                    # raise HTTPError
-                    response.status_code = 403
-
-                    log_status = "HTTP_ERROR"
-                    log_reason = "Access forbidden (403) - using Playwright fallback"
-                    raise requests.exceptions.HTTPError(response)
-                    
-                elif "text/html" in content_type:
-                    content = response.text.encode("utf-8")
-                    text_content = response.text
-                    filepath = html_filepath
-                    if "help.byupathway.edu" in url:
-                        # from the content, get the information from the .wrapper-body
-                        content = response.text
-                        soup = BeautifulSoup(content, "html.parser")
-                        content = soup.find("div", class_="wrapper-body").prettify()
-                        text_content = content
+                await asyncio.sleep(3)
+                async with session.get(url, timeout=REQUEST_TIMEOUT) as response:
+                    response.raise_for_status()  # http errors
+                    content_type = response.headers.get("content-type", "")
+
+                    log_status = "SUCCESS"
+                    log_reason = f"Content Type: {content_type}"
+                    log_filepath = ""
+                    content_hash = None
+
+                    if any(domain in url for domain in ["faq.whatsapp"]):
+                        content = await get_whatsapp_content(url)
+                        filepath = html_filepath
+                        await asyncio.to_thread(write_file, filepath, content)
                         content = content.encode("utf-8")
-                    elif "studentservices.byupathway.edu" in url:
-                        content = response.text
-                        soup = BeautifulSoup(content, "html.parser")
-                        try:
-                            content = soup.find("article", class_="main-content").prettify()
-                        except AttributeError:
-                            print("Error with ", url)
-                            log_status = "PARSE_ERROR"
-                            log_reason = "Error finding main content in HTML"
-                        tablist = soup.find("div", {"role": "tablist"})
-                        if tablist:
-                            tab_links = tablist.find_all("a")
-                            # get only the links
-                            tab_links = [
-                                {
-                                    "title": link.text.strip(),
-                                    "url": url + "#" + link.get("href").split("#")[1],
-                                }
-                                for link in tab_links
-                                if "#" in link.get("href")
-                            ]
-                            tab_content = await fetch_content_from_student_services(tab_links)
-                            content += tab_content
-                        text_content = content
-                        content = content.encode("utf-8")
-                    with open(filepath, "w", encoding="utf-8") as f:
-                        f.write(text_content)
-                    log_filepath = filepath
+                        log_filepath = filepath
+                    elif any(
+                        domain in url
+                        for domain in [
+                            "articulate.com",
+                            "myinstitute.churchofjesuschrist.org",
+                        ]
+                    ):
+                        # raise HTTPError
+                        log_status = "HTTP_ERROR"
+                        log_reason = "Access forbidden (403) - using Playwright fallback"
+                        raise aiohttp.ClientResponseError(
+                            response.request_info, response.history, status=403, message="Forbidden"
+                        )
+
+                    elif "text/html" in content_type:
+                        # Keep the body as UTF-8 bytes from here on; it is only decoded by the parser
+                        content = to_utf8(await response.read(), response.get_encoding())
+                        filepath = html_filepath
+                        if "help.byupathway.edu" in url:
+                            # from the content, get the information from the .wrapper-body
+                            soup = BeautifulSoup(
+                                content, HTML_PARSER, parse_only=WRAPPER_BODY_STRAINER, from_encoding="utf-8"
+                            )
+                            content = soup.find("div", class_="wrapper-body").encode()
+                        elif "studentservices.byupathway.edu" in url:
+                            # full parse: the tablist is not guaranteed to live inside the article
+                            soup = BeautifulSoup(content, HTML_PARSER, from_encoding="utf-8")
+                            try:
+                                content = soup.find("article", class_="main-content").encode()
+                            except AttributeError:
+                                print("Error with ", url)
+                                log_status = "PARSE_ERROR"
+                                log_reason = "Error finding main content in HTML"
+                            tablist = soup.find("div", {"role": "tablist"})
+                            if tablist:
+                                tab_links = tablist.find_all("a")
+                                # get only the links
+                                tab_links = [
+                                    {
+                                        "title": link.text.strip(),
+                                        "url": url + "#" + link.get("href").split("#")[1],
+                                    }
+                                    for link in tab_links
+                                    if "#" in link.get("href")
+                                ]
+                                tab_content = await fetch_content_from_student_services(tab_links)
+                                content += tab_content.encode("utf-8")
+                        await asyncio.to_thread(write_file, filepath, content)
+                        log_filepath = filepath
+
+                    elif "application/pdf" in content_type:
+                        filepath = pdf_filepath
+                        content_hash = await stream_to_file(response, filepath)
+                        log_filepath = filepath
 
-                elif "application/pdf" in content_type:
-                    content = response.content
-                    filepath = pdf_filepath
-                    with open(filepath, "wb") as f:
-                        f.write(response.content)
-                    log_filepath = filepath
+                    else:
+                        # Handle other content types by saving with the correct extension
+                        file_extension = content_type.split("/")[-1].split(";")[0]
+                        filepath = os.path.join(crawl_path, "others", f"{filename}.{file_extension}")
+                        content_hash = await stream_to_file(response, filepath)
+                        log_filepath = filepath
 
-                else:
-                    # Handle other content types by saving with the correct extension
-                    file_extension = content_type.split("/")[-1].split(";")[0]
-                    filepath = os.path.join(crawl_path, "others", f"{filename}.{file_extension}")
-                    content = response.content
-                    with open(filepath, "wb") as f:
-                        f.write(content)
-                    log_filepath = filepath
-
-                # Create content hash
-                content_hash = generate_content_hash(content)
-
-                # Append to the output list
-                output_data.append([
-                    heading,
-                    sub_heading,
-                    title,
-                    url,
-                    filepath,
-                    content_type.split("/")[1].split(";")[0],
-                    content_hash,
-                    datetime.datetime.now().isoformat(),
-                    role,
-                ])
+                    # Create content hash; streamed bodies were hashed while being written
+                    if content_hash is None:
+                        content_hash = generate_content_hash(content)
 
-                log_entry = {
-                    "timestamp": datetime.datetime.now().isoformat(),
-                    "stage": "crawl",
-                    "url": url,
-                    "status": log_status,
-                    "reason": log_reason,
-                    "filepath": log_filepath,
-                }
-                if detailed_log_path:
-                    with open(detailed_log_path, "a") as f:
-                        f.write(json.dumps(log_entry) + "\n")
+                    now = datetime.datetime.now().isoformat()
 
-                break  # Exit retry loop after successful fetch
+                    # Append to the output list once duplicate content across rows is resolved
+                    output_values = [
+                        heading,
+                        sub_heading,
+                        title,
+                        url,
+                        filepath,
+                        content_type.split("/")[1].split(";")[0],
+                        content_hash,
+                        now,
+                        role,
+                    ]
 
-            except requests.exceptions.HTTPError as http_err:
-                print(response.status_code)
+                    log_entry = {
+                        "timestamp": now,
+                        "stage": "crawl",
+                        "url": url,
+                        "status": log_status,
+                        "reason": log_reason,
+                        "filepath": log_filepath,
+                    }
+                    fetched.append((order, output_values, log_entry))
+
+                    break  # Exit retry loop after successful fetch
+
+            except aiohttp.ClientResponseError as http_err:
+                print(http_err.status)
+                now = datetime.datetime.now().isoformat()
                 log_entry = {
-                    "timestamp": datetime.datetime.now().isoformat(),
+                    "timestamp": now,
                     "stage": "crawl",
                     "url": url,
                     "status": "HTTP_ERROR",
-                    "reason": f"HTTP Error {response.status_code}: {http_err}",
+                    "reason": f"HTTP Error {http_err.status}: {http_err}",
                     "filepath": None,
                 }
-                if response.status_code == 403:
+                if http_err.status == 403:
                     print(f"Access forbidden for {url}: {http_err}. Using Playwright to fetch HTML.")
-                    html_filepath = os.path.join(crawl_path, "html", f"{filename}.html")
                     await fetch_content_with_playwright(url, html_filepath)
-                    output_data.append([
+                    add_output_row(
                         heading,
                         sub_heading,
                         title,
@@ -285,16 +452,14 @@ async def crawl_csv(df, base_dir, output_file="output_data.csv", detailed_log_pa
                         html_filepath,
                         "text/html",
                         None,
-                        datetime.datetime.now().isoformat(),
+                        now,
                         role,
-                    ])
+                    )
 
                     log_entry["status"] = "SUCCESS_WITH_PLAYWRIGHT_FALLBACK"
                     log_entry["reason"] = "Access forbidden (403), rescued with Playwright"
                     log_entry["filepath"] = html_filepath
-                    if detailed_log_path:
-                        with open(detailed_log_path, "a") as f:
-                            f.write(json.dumps(log_entry) + "\n")
+                    log(log_entry)
 
                     break  # Don't retry if it's a 403 error
                 else:
@@ -303,30 +468,29 @@ async def crawl_csv(df, base_dir, output_file="output_data.csv", detailed_log_pa
                     if retry_attempts > 0:
                         print("Retrying in 10 seconds...")
                         log_entry["reason"] += " Retrying..."
-                        time.sleep(10)
+                        await asyncio.sleep(10)
                     else:
-                        output_data.append([
+                        add_output_row(
                             heading,
                             sub_heading,
                             title,
                             url,
                             str(http_err),
-                            str(response.status_code),
+                            str(http_err.status),
                             None,
-                            datetime.datetime.now().isoformat(),
+                            now,
                             role,
-                        ])
+                        )
 
                         log_entry["status"] = "FAILED_HTTP_ERROR"
-                        log_entry["reason"] = f"HTTP Error {response.status_code}: {http_err}. Max retries reached."
-                        if detailed_log_path:
-                            with open(detailed_log_path, "a") as f:
-                                f.write(json.dumps(log_entry) + "\n")
+                        log_entry["reason"] = f"HTTP Error {http_err.status}: {http_err}. Max retries reached."
+                        log(log_entry)
 
-            except requests.exceptions.RequestException as err:
+            except (aiohttp.ClientError, asyncio.TimeoutError) as err:
                 print(f"Error occurred for {url}: {err}")
+                now = datetime.datetime.now().isoformat()
                 log_entry = {
-                    "timestamp": datetime.datetime.now().isoformat(),
+                    "timestamp": now,
                     "stage": "crawl",
                     "url": url,
                     "status": "REQUEST_ERROR",
@@ -337,10 +501,10 @@ async def crawl_csv(df, base_dir, output_file="output_data.csv", detailed_log_pa
                 if retry_attempts > 0:
                     print("Retrying in 10 seconds...")
                     log_entry["reason"] += " Retrying..."
-                    time.sleep(10)
+                    await asyncio.sleep(10)
                 else:
                     print(f"No content-type header found for {url}: {err}")
-                    output_data.append([
+                    add_output_row(
                         heading,
                         sub_heading,
                         title,
@@ -348,38 +512,61 @@ async def crawl_csv(df, base_dir, output_file="output_data.csv", detailed_log_pa
                         str(err),
                         "Error",
                         None,
-                        datetime.datetime.now().isoformat(),
+                        now,
                         role,
-                    ])
+                    )
 
                     log_entry["status"] = "FAILED_REQUEST_ERROR"
                     log_entry["reason"] = f"Request Exception: {err}. Max retries reached."
-                    if detailed_log_path:
-                        with open(detailed_log_path, "a") as f:
-                            f.write(json.dumps(log_entry) + "\n")
-
-    # Process rows in batches of 10 to manage memory usage efficiently
-    batch_size = 10
-    for i in range(0, len(df), batch_size):
-        batch = df.iloc[i : i + batch_size]  # Get next batch of rows
-        tasks = [process_row(row) for _, row in batch.iterrows()]  # Create tasks for batch
-        await asyncio.gather(*tasks)  # Process batch before continuing
+                    log(log_entry)
+
+    # Share one connection pool across all rows and bound the number of rows in flight
+    connector = aiohttp.TCPConnector(limit=50, ttl_dns_cache=300)
+    try:
+        # Log entries go through one buffered handle, flushed and closed once every row is done
+        with DetailedLogger(detailed_log_path) as logger:
+            log = logger.emit
+            async with aiohttp.ClientSession(connector=connector) as session:
+                semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+                async def bounded_process_row(order, row):
+                    async with semaphore:
+                        try:
+                            await process_row(session, order, row)
+                        except Exception as err:
+                            # Record the row as failed so one bad page doesn't abort the other rows
+                            print(f"Unexpected error for {row['URL']}: {err}")
+                            now = datetime.datetime.now().isoformat()
+                            add_output_row(
+                                row["Section"],
+                                row["Subsection"],
+                                row["Title"],
+                                row["URL"],
+                                str(err),
+                                "Error",
+                                None,
+                                now,
+                                row["Role"],
+                            )
+                            log({
+                                "timestamp": now,
+                                "stage": "crawl",
+                                "url": row["URL"],
+                                "status": "FAILED_UNEXPECTED_ERROR",
+                                "reason": f"{type(err).__name__}: {err}",
+                                "filepath": None,
+                            })
+
+                await asyncio.gather(
+                    *(bounded_process_row(order, row) for order, (_, row) in enumerate(df.iterrows()))
+                )
+            record_fetched_rows()
+    finally:
+        # The shared browser is bound to this event loop, so shut it down before returning
+        await playwright_pool.close()
 
     # Create a DataFrame from the output data
-    output_df = pd.DataFrame(
-        output_data,
-        columns=[
-            "Heading",
-            "Subheading",
-            "Title",
-            "URL",
-            "Filepath",
-            "Content Type",
-            "Content Hash",
-            "Last Update",
-            "Role",
-        ],
-    )
+    output_df = pd.DataFrame(output_data, columns=OUTPUT_COLUMNS)
     # Filtering rows where 'Content Hash' is None
     error_df = output_df[output_df["Content Hash"].isnull()]
     
@@ -389,23 +576,17 @@ async def crawl_csv(df, base_dir, output_file="output_data.csv", detailed_log_pa
     
     # Save error file with new name in error folder
     error_csv_path = os.path.join(error_folder, "error.csv")
-    with open(error_csv_path, "a") as f:
+    with open(error_csv_path, "a", newline="") as f:
         f.write("Failed HTTP Errors\n")
-    error_df.to_csv(error_csv_path, mode="a", index=False, header=True)
-
-    out_path = os.path.join(base_dir, output_file)
+        error_df.to_csv(f, index=False, header=True)
 
     # Append to the existing CSV file or create a new one if it doesn't exist
     if os.path.exists(out_path):
         existing_df = pd.read_csv(out_path)
         combined_df = pd.concat([existing_df, output_df], ignore_index=True)
 
-        # Delete the 'Last Update' column temporarily to remove duplicates
-        combined_df_no_update = combined_df.drop(columns=["Last Update"])
-        combined_df_no_update = combined_df_no_update.drop_duplicates()
-
-        # Add the 'Last Update' column back
-        combined_df = combined_df_no_update.join(combined_df["Last Update"])
+        # A row is identified by its URL and content hash; keep the most recent crawl of each
+        combined_df = combined_df.drop_duplicates(subset=["URL", "Content Hash"], keep="last")
 
         combined_df.to_csv(out_path, mode="w", index=False)
     else:
@@ -1,8 +1,12 @@
+import asyncio
 import re
 import os
 import json
 from typing import Any, cast, Dict, List, Optional
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup, Tag
 from playwright.async_api import async_playwright
 import time
@@ -10,6 +14,36 @@ from urllib.parse import urljoin
 
 from utils.tools import create_folder
 
+# C-backed parser used for every BeautifulSoup parse of the index pages
+HTML_PARSER = "lxml"
+
+# Shared session so repeated requests to the same host reuse pooled connections
+_SESSION = requests.Session()
+_ADAPTER = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        raise_on_status=False,
+    ),
+)
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.mount("http://", _ADAPTER)
+
+# Patterns and translation table used by clean()
+_RE_MULTIBLANK = re.compile(r"(\n\s*)+\n")
+_RE_TRAIL_SPACE_NL = re.compile(r" +\n")
+_RE_CRLF = re.compile(r"\r\n")
+_TRANSLATE = str.maketrans({"\xa0": " ", "\u200b": "", "\u200a": " "})
+
+# Number of help center API pages requested concurrently
+HELP_PAGE_WINDOW = 8
+
+# Control characters that can break json.loads() on help center payloads
+_RE_CTRL = re.compile(r"[\x00-\x1f\x7f]")
+
 
 # clean function for the parse-index
 def clean(text: Any) -> str:
@@ -21,10 +55,10 @@ def clean(text: Any) -> str:
     if not isinstance(text, str):
         text = str(text)
     # Replace non-breaking space with normal space and remove surrounding whitespace.
-    text = text.replace(" ", " ").replace("\u200b", "").replace("\u200a", " ")
-    text = re.sub(r"(\n\s*)+\n", "\n\n", text)
-    text = re.sub(r" +\n", "\n", text)
-    text = re.sub(r"\r\n", " ", text)
+    text = text.translate(_TRANSLATE)
+    text = _RE_MULTIBLANK.sub("\n\n", text)
+    text = _RE_TRAIL_SPACE_NL.sub("\n", text)
+    text = _RE_CRLF.sub(" ", text)
     return cast(str, text.strip())
 
 
@@ -55,42 +89,37 @@ def get_data(soup: BeautifulSoup, selectors: Selectors) -> list:
     # elems = soup.select("p.MsoNormal")
 
     for elem in elems:
+        # select each selector once per element and reuse the match
+        sub_header_match = elem.select(sub_header)
         # in this if, vaidate if the element is a header
-        if elem.select(sub_header) or elem.name == sub_header:
-            if elem.select(sub_header):
-                sub_header_text = elem.select(sub_header)[0].text
-            else:
-                sub_header_text = elem.text
+        if sub_header_match or elem.name == sub_header:
+            sub_header_text = sub_header_match[0].text if sub_header_match else elem.text
             cur_sub_header = clean(sub_header_text)
-        elif elem.select(header) or elem.name == header:
-            if elem.select(header):
-                header_text = elem.select(header)[0].text
-            else:
-                header_text = elem.text
+            continue
+        header_match = elem.select(header)
+        if header_match or elem.name == header:
+            header_text = header_match[0].text if header_match else elem.text
             cur_header = clean(header_text)
             cur_sub_header = None
-        elif elem.select(link):
-            if len(elem.select(link)) > 0:
-                link_text = elem.select(link)[0].get_attribute_list("href")[0]
-                text_text = (
-                    elem.select(text)[0].text
-                    if len(elem.select(text))
-                    else elem.select(link)[0].text
-                )
-
-                # save the row
-                rows.append(
-                    [cur_header, cur_sub_header, clean(text_text), clean(link_text)]
-                )
+            continue
+        link_match = elem.select(link)
+        if link_match:
+            link_text = link_match[0].get_attribute_list("href")[0]
+            text_match = elem.select(text)
+            text_text = text_match[0].text if text_match else link_match[0].text
+
+            # save the row
+            rows.append(
+                [cur_header, cur_sub_header, clean(text_text), clean(link_text)]
+            )
 
     return rows
 
 
 def crawl_index(url, selectors: Selectors):
     """Crawl the index page and get the data."""
-    parser = "html.parser"
-    response = requests.get(url, timeout=10)
-    soup = BeautifulSoup(response.content, features=parser)
+    response = _SESSION.get(url, timeout=10)
+    soup = BeautifulSoup(response.content, features=HTML_PARSER)
     data = get_data(soup, selectors)
     return data
 
@@ -118,9 +147,8 @@ def create_root_folders(root):
 
 def get_soup_content(url):
     """Get the soup object from the url."""
-    parser = "html.parser"
-    response = requests.get(url, timeout=10)
-    soup = BeautifulSoup(response.content, features=parser)
+    response = _SESSION.get(url, timeout=10)
+    soup = BeautifulSoup(response.content, features=HTML_PARSER)
     return soup
 
 
@@ -161,7 +189,7 @@ def _clean_json_text(raw_text: str) -> str:
     Remove problematic control characters from raw JSON text
     that could cause json.loads() to fail.
     """
-    return re.sub(r'[\x00-\x1f\x7f]', '', raw_text)
+    return _RE_CTRL.sub("", raw_text)
 
 
 def _fetch_help_page(page: int, base_url: str, lang: str = "en", timeout: int = 15) -> Optional[Dict[str, Any]]:
@@ -182,17 +210,26 @@ def _fetch_help_page(page: int, base_url: str, lang: str = "en", timeout: int =
     params = {"page": page, "lang": lang}
     
     try:
-        resp = requests.get(api_url, headers=headers, params=params, timeout=timeout)
+        resp = _SESSION.get(api_url, headers=headers, params=params, timeout=timeout)
         resp.raise_for_status()
     except requests.RequestException as e:
         print(f"Network error fetching help page {page}: {e}")
         return None
 
+    # Well-formed payloads parse straight from bytes; only sanitize when a stricter parse fails
+    try:
+        return orjson.loads(resp.content)
+    except orjson.JSONDecodeError:
+        pass
+
     raw = resp.text
-    cleaned = _clean_json_text(raw)
+    try:
+        return json.loads(raw, strict=False)
+    except json.JSONDecodeError:
+        pass
 
     try:
-        return json.loads(cleaned)
+        return json.loads(_clean_json_text(raw))
     except json.JSONDecodeError as e:
         print(f"JSON parse error on help page {page}: {e}")
         return None
@@ -226,35 +263,39 @@ async def get_help_links(url, selector):
     page = 1
 
     while True:
-        page_data = _fetch_help_page(page, base_url)
-        if not page_data:
-            print(f"Stopping help articles fetch at page {page} due to error.")
-            break
-
-        results = page_data.get("results", [])
-        for item in results:
-            article_id = item.get("articleId")
-            title = item.get("title", "")
-            
-            if article_id and title:
-                article_url = _build_help_article_url(article_id, base_url)
-                # Format: [section, subsection, title, url]
-                # Using "Help Articles" as section and empty subsection for consistency
-                data.append(["Help Articles", "", clean(title), article_url])
-
-        # Check if there are more records to fetch
-        if not page_data.get("morerecords", False):
-            break
-
-        page += 1
+        # Fetch a window of pages concurrently; pages fetched past the last one are discarded
+        window = range(page, page + HELP_PAGE_WINDOW)
+        pages_data = await asyncio.gather(
+            *(asyncio.to_thread(_fetch_help_page, window_page, base_url) for window_page in window)
+        )
 
-    return data
+        for page_number, page_data in zip(window, pages_data):
+            if not page_data:
+                print(f"Stopping help articles fetch at page {page_number} due to error.")
+                return data
+
+            results = page_data.get("results", [])
+            for item in results:
+                article_id = item.get("articleId")
+                title = item.get("title", "")
+
+                if article_id and title:
+                    article_url = _build_help_article_url(article_id, base_url)
+                    # Format: [section, subsection, title, url]
+                    # Using "Help Articles" as section and empty subsection for consistency
+                    data.append(["Help Articles", "", clean(title), article_url])
+
+            # Check if there are more records to fetch
+            if not page_data.get("morerecords", False):
+                return data
+
+        page += HELP_PAGE_WINDOW
 
 
 async def get_services_links(url):
     """Get the links from the student services page."""
-    content = requests.get(url, timeout=10).content
-    soup = BeautifulSoup(content, "html.parser")
+    content = _SESSION.get(url, timeout=10).content
+    soup = BeautifulSoup(content, HTML_PARSER)
     # get the nav with aria-label="Navigation"
     nav = soup.find("nav", {"aria-label": "Mobile Navigation"})
     li_elems = nav.find_all("li")
@@ -4,77 +4,231 @@ Langfuse Data Processor
 Extracts user inputs from Langfuse CSV data, including metadata, and saves them to a structured CSV file.
 """
 
+import contextlib
 import csv
 import datetime
-import json
+import gzip
+import operator
 import os
-from typing import Any, Dict, List
+import queue
+import sys
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Iterator, List, NamedTuple, Optional
 
+import numpy as np
+import orjson
+import pandas as pd
 
-def extract_user_inputs_from_csv(csv_path: str, input_columns: List[str] = None) -> List[Dict[str, Any]]:
+# Number of rows parsed at a time, so large exports are never held in memory whole
+CSV_CHUNK_ROWS = 50_000
+
+# Rows handed over per batch by a _ReadAhead, and the number of batches it may buffer
+READ_AHEAD_BATCH_ROWS = 5_000
+READ_AHEAD_MAX_BATCHES = 4
+
+# Metadata fields copied into each output row, read together with one itemgetter call
+_METADATA_KEYS = ("country", "user_language", "state", "city", "feedback")
+_METADATA_DEFAULTS = dict.fromkeys(_METADATA_KEYS, "")
+_get_metadata_fields = operator.itemgetter(*_METADATA_KEYS)
+
+# Columns of the extracted user inputs CSV, in the order rows are built
+OUTPUT_FIELDNAMES = (
+    "Date",
+    "Country",
+    "User Language",
+    "State",
+    "City",
+    "Question",
+    "Output",
+    "Metadata",
+    "User Feedback",
+)
+
+
+class UserInput(NamedTuple):
+    """One extracted user input, with fields in OUTPUT_FIELDNAMES order."""
+
+    date: str
+    country: str
+    user_language: str
+    state: str
+    city: str
+    question: str
+    output: str
+    metadata: str
+    user_feedback: str
+
+
+class _ReadAhead:
     """
-    Extract user inputs and metadata from a Langfuse CSV file.
+    Consumes an iterator on an executor while the caller does other work, buffering at most
+    READ_AHEAD_MAX_BATCHES batches of its items. Call close() if iteration may stop early.
+    """
+
+    _END = object()
+
+    def __init__(self, executor: Executor, items: Iterator) -> None:
+        self._batches: queue.Queue = queue.Queue(maxsize=READ_AHEAD_MAX_BATCHES)
+        self._stop = threading.Event()
+        self._future = executor.submit(self._produce, items)
+
+    def _produce(self, items: Iterator) -> None:
+        try:
+            batch = []
+            for item in items:
+                batch.append(item)
+                if len(batch) == READ_AHEAD_BATCH_ROWS:
+                    if self._stop.is_set():
+                        return
+                    self._batches.put(batch)
+                    batch = []
+            self._batches.put(batch)
+        finally:
+            # Release what the items hold (such as an open CSV) even when stopped early
+            if hasattr(items, "close"):
+                items.close()
+            self._batches.put(self._END)
+
+    def __iter__(self) -> Iterator:
+        while (batch := self._batches.get()) is not self._END:
+            yield from batch
+        # Re-raise anything the producer failed with
+        self._future.result()
+
+    def close(self) -> None:
+        """Stop the producer, unblocking it by draining the buffer until it finishes."""
+        self._stop.set()
+        while not self._future.done():
+            with contextlib.suppress(queue.Empty):
+                self._batches.get(timeout=0.1)
+
+
+def _intern(value):
+    """Intern string values so repeated ones share a single object."""
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def yield_user_inputs(csv_path: str, input_columns: Optional[List[str]] = None) -> Iterator[UserInput]:
+    """
+    Yield user inputs and metadata from a Langfuse CSV file one row at a time.
 
     Args:
         csv_path: Path to the CSV file.
         input_columns: List of column names to extract from (default: ['input']).
 
-    Returns:
-        List[Dict[str, Any]]: A list of dictionaries, each containing the user input and associated metadata.
+    Yields:
+        UserInput: A row containing the user input and associated metadata.
     """
     if input_columns is None:
         input_columns = ["input"]
 
-    user_inputs = []
-
-    if not os.path.exists(csv_path):
-        print(f"[WARNING] CSV file not found: {csv_path}")
-        return user_inputs
-
-    print(f">>> Processing {csv_path}")
-
-    with open(csv_path, encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-
-        for row in reader:
-            for column in input_columns:
-                value = row.get(column, "")
-                if value:
-                    input_text = str(value).strip()
-                    if input_text:
-                        # Extract metadata
-                        metadata_str = row.get("metadata", "{}")
-                        metadata = {}
-                        try:
-                            metadata = json.loads(metadata_str) if metadata_str else {}
-                        except json.JSONDecodeError:
-                            print(f"[WARNING] Could not decode metadata JSON: {metadata_str}")
-
-                        # Extract desired fields
-                        timestamp = row.get("timestamp", "")
-                        country = metadata.get("country", "")
-                        user_language = metadata.get("user_language", "")
-                        state = metadata.get("state", "")
-                        city = metadata.get("city", "")
-                        output = row.get("output", "")
-                        feedback = row.get("user_feedback", metadata.get("feedback", ""))
-
-                        user_inputs.append({
-                            "Question": input_text,
-                            "Date": timestamp,
-                            "Country": country,
-                            "User Language": user_language,
-                            "State": state,
-                            "City": city,
-                            "Output": output,
-                            "Metadata": metadata_str,
-                            "User Feedback": feedback,
-                        })
-
-    return user_inputs
-
-
-def process_langfuse_data(traces_csv: str, observations_csv: str, output_folder: str) -> str:
+    # Parse only the columns we use, keeping every value as a string ("" for empty cells). The file is
+    # memory-mapped and handed to the C parser as bytes, so only the kept columns are decoded.
+    wanted = {*input_columns, "timestamp", "metadata", "output", "user_feedback"}
+    with contextlib.ExitStack() as stack:
+        # Only a missing file is reported here; errors while reading it still propagate
+        try:
+            f = stack.enter_context(open(csv_path, "rb"))
+        except FileNotFoundError:
+            print(f"[WARNING] CSV file not found: {csv_path}")
+            return
+
+        print(f">>> Processing {csv_path}")
+
+        # An empty file cannot be memory-mapped and has no rows anyway
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        try:
+            chunks = pd.read_csv(
+                f,
+                usecols=lambda c: c in wanted,
+                dtype=str,
+                keep_default_na=False,
+                chunksize=CSV_CHUNK_ROWS,
+                encoding="utf-8",
+                memory_map=True,
+            )
+        except pd.errors.EmptyDataError:
+            return
+        with chunks:
+            for df in chunks:
+                yield from _yield_chunk_user_inputs(df, input_columns)
+
+
+def _yield_chunk_user_inputs(df: pd.DataFrame, input_columns: List[str]) -> Iterator[UserInput]:
+    """Yield the user input rows of one chunk of a Langfuse CSV file."""
+    # Drop rows whose input columns are all blank before doing any per-row work
+    present_columns = [column for column in input_columns if column in df.columns]
+    if not present_columns:
+        return
+    # Strip the input columns once, vectorized; the rows below read the stripped text directly
+    for column in present_columns:
+        df[column] = df[column].str.strip()
+    has_input = np.logical_or.reduce([df[column].str.len().to_numpy() > 0 for column in present_columns])
+
+    # Fill columns that may be missing with their defaults and resolve every position once
+    for column, default in (("timestamp", ""), ("metadata", "{}"), ("output", "")):
+        if column not in df.columns:
+            df[column] = default
+    position = {column: i for i, column in enumerate(df.columns)}
+    input_positions = [position[column] for column in present_columns]
+    timestamp_i = position["timestamp"]
+    metadata_i = position["metadata"]
+    output_i = position["output"]
+    feedback_i = position.get("user_feedback")
+
+    for row in df[has_input].itertuples(index=False, name=None):
+        # Extract metadata once per row; it is shared by every input column
+        metadata_str = row[metadata_i]
+        metadata = {}
+        try:
+            metadata = orjson.loads(metadata_str) if metadata_str else {}
+        except orjson.JSONDecodeError:
+            print(f"[WARNING] Could not decode metadata JSON: {metadata_str}")
+        country, user_language, state, city, metadata_feedback = _get_metadata_fields({
+            **_METADATA_DEFAULTS,
+            **metadata,
+        })
+        # Location and language values repeat across rows; share one string object per value
+        country, user_language, state, city = map(_intern, (country, user_language, state, city))
+
+        for input_i in input_positions:
+            input_text = row[input_i]
+            if input_text:
+                # Extract desired fields
+                timestamp = row[timestamp_i]
+                output = row[output_i]
+                feedback = row[feedback_i] if feedback_i is not None else metadata_feedback
+
+                yield UserInput(
+                    timestamp,
+                    country,
+                    user_language,
+                    state,
+                    city,
+                    input_text,
+                    output,
+                    metadata_str,
+                    feedback,
+                )
+
+
+def extract_user_inputs_from_csv(csv_path: str, input_columns: Optional[List[str]] = None) -> List[UserInput]:
+    """
+    Extract user inputs and metadata from a Langfuse CSV file.
+
+    Args:
+        csv_path: Path to the CSV file.
+        input_columns: List of column names to extract from (default: ['input']).
+
+    Returns:
+        List[UserInput]: A list of rows, each containing the user input and associated metadata.
+    """
+    return list(yield_user_inputs(csv_path, input_columns))
+
+
+def process_langfuse_data(traces_csv: str, observations_csv: str, output_folder: str, compress: bool = False) -> str:
     """
     Process Langfuse CSV files and extract user inputs with metadata.
 
@@ -82,64 +236,73 @@ def process_langfuse_data(traces_csv: str, observations_csv: str, output_folder:
         traces_csv: Path to traces CSV file.
         observations_csv: Path to observations CSV file.
         output_folder: Folder to save the output CSV file.
+        compress: Write the output gzip-compressed, as a .csv.gz file.
 
     Returns:
         str: Path to the output CSV file.
     """
-    all_user_inputs = []
-
     print(">>> Extracting user inputs from Langfuse data...")
 
-    # Process traces
-    if traces_csv and os.path.exists(traces_csv):
-        print(f"   Processing traces: {traces_csv}")
-        trace_inputs = extract_user_inputs_from_csv(traces_csv, ["input"])
-        all_user_inputs.extend(trace_inputs)
-        print(f"   Found {len(trace_inputs)} user inputs in traces")
-    else:
-        print("   No traces CSV file to process")
-
-    # Process observations
-    if observations_csv and os.path.exists(observations_csv):
-        print(f"   Processing observations: {observations_csv}")
-        obs_inputs = extract_user_inputs_from_csv(observations_csv, ["input"])
-        all_user_inputs.extend(obs_inputs)
-        print(f"   Found {len(obs_inputs)} user inputs in observations")
-    else:
-        print("   No observations CSV file to process")
-
     # Generate output filename with today's date
     today = datetime.datetime.now().strftime("%m_%d_%y")
     output_file = os.path.join(output_folder, f"extracted_user_inputs_{today}.csv")
+    if compress:
+        output_file += ".gz"
 
     # Save to CSV file
     os.makedirs(output_folder, exist_ok=True)
 
-    print(f">>> Saving {len(all_user_inputs)} user inputs to {output_file}")
+    print(f">>> Saving user inputs to {output_file}")
+
+    # Observations are parsed ahead on a worker thread, a few bounded batches at a time, while traces
+    # stream into the writer; rows are still written traces first, skipping questions already written
+    # with the same timestamp (traces and observations overlap)
+    total_inputs = 0
+    duplicates = 0
+    seen = set()
+    open_output = gzip.open if compress else open
+    with ThreadPoolExecutor(max_workers=1) as executor, open_output(
+        output_file, "wt", encoding="utf-8", newline=""
+    ) as f, contextlib.ExitStack() as stack:
+        if observations_csv:
+            observations = stack.enter_context(
+                contextlib.closing(_ReadAhead(executor, yield_user_inputs(observations_csv, ["input"])))
+            )
+        writer = csv.writer(f)
+        writer.writerow(OUTPUT_FIELDNAMES)
+        # Bound once; these are called for every row
+        write_row = writer.writerow
+        mark_seen = seen.add
 
-    if not all_user_inputs:
+        sources = (
+            ("traces", traces_csv, lambda: yield_user_inputs(traces_csv, ["input"])),
+            ("observations", observations_csv, lambda: observations),
+        )
+        for label, csv_path, get_rows in sources:
+            if csv_path:
+                print(f"   Processing {label}: {csv_path}")
+                found = 0
+                for row in get_rows():
+                    found += 1
+                    key = (row.question, row.date)
+                    if key in seen:
+                        duplicates += 1
+                        continue
+                    mark_seen(key)
+                    write_row(row)
+                    total_inputs += 1
+                print(f"   Found {found} user inputs in {label}")
+            else:
+                print(f"   No {label} CSV file to process")
+
+    if not total_inputs:
+        os.remove(output_file)
         print("[WARNING] No user inputs to save.")
         return output_file
 
-    fieldnames = [
-        "Date",
-        "Country",
-        "User Language",
-        "State",
-        "City",
-        "Question",
-        "Output",
-        "Metadata",
-        "User Feedback",
-    ]
-
-    with open(output_file, "w", encoding="utf-8", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(all_user_inputs)
-
     print("[SUCCESS] User inputs extracted successfully!")
-    print(f"   Total user inputs saved: {len(all_user_inputs)}")
+    print(f"   Total user inputs saved: {total_inputs}")
+    print(f"   Duplicate user inputs skipped: {duplicates}")
     print(f"   Output file: {output_file}")
 
     return output_file
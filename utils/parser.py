@@ -1,31 +1,204 @@
+import asyncio
 import csv
 import datetime
-import json
+import html
 import logging
+import operator
 import os
+import random
 import re
 import shutil
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
 
 import nest_asyncio
+import pandas as pd
+import soupsieve
 import yaml
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from dotenv import load_dotenv
 from llama_index.core import SimpleDirectoryReader
 from llama_parse import LlamaParse
-from markdownify import markdownify as md
+from markdownify import MarkdownConverter
 from unstructured_client import UnstructuredClient
 from unstructured_client.models import shared
 from unstructured_client.models.errors import SDKError
 
 from utils.markdown_utils import unstructured_elements_to_markdown
-from utils.tools import get_domain, get_files
+from utils.tools import DetailedLogger, get_domain, get_files
 
 # Set the logging level to WARNING or higher to suppress INFO messages
 logging.basicConfig(level=logging.WARNING)
 nest_asyncio.apply()
 load_dotenv()
 
+# C-backed parser used for every BeautifulSoup parse of the crawled HTML
+HTML_PARSER = "lxml"
+
+# The page title and body are the only parts convert_html_to_markdown keeps, so the rest of the
+# head (scripts, styles, meta and link tags) is never built into the tree
+HTML_STRAINER = SoupStrainer(["title", "body"])
+
+# add_titles_tag only needs the page title: a bytes pattern finds it without parsing, and the
+# strainer is the fallback for markup the pattern misses
+_RE_HTML_TITLE = re.compile(rb"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+TITLE_STRAINER = SoupStrainer("title")
+
+# Converts the cleaned tree directly, instead of serializing it and letting markdownify re-parse it
+MARKDOWN_CONVERTER = MarkdownConverter(heading_style="ATX")
+
+# Patterns used by clean_markdown, compiled once. Removals that ran back to back are combined
+# into alternations so each group is a single pass over the text.
+_RE_BACKTICKS = re.compile(r"`*```markdown|`+")
+_RE_PRINT_LINK = re.compile(r"\[Print\]\(javascript:window\.print\(\)\)")
+_RE_REPEATED_LINKS = re.compile(r"(?:https?:\/\/[^\s]+\s+){2,}")
+_RE_LINK = re.compile(r"\[([^\]]+)\]\(([^)]+)\)")
+_RE_SAME_PAGE_LINKS_AND_KB_TABLES = re.compile(
+    r"(?:\[[^\]]+\]\(#\))+(?:\s|,)*"
+    r"|\| \*\*Bot Information\*\* \|\n\| --- \|"
+    r"|\| \*\*Information\*\* \|\n\| --- \|"
+    r"|(?s:Views:\n\n\|\s*Article Overview\s*\|\s*\n\|\s*---\s*\|\s*\n\|.*?\|)"
+    r"|(?s:\|\s*Information\s*\|\s*\n\|\s*---\s*\|\s*\n\|.*?\|)"
+    r"|(?s:\|\s*Bot Information\s*\|\s*\n\|\s*---\s*\|\s*\n\|.*?\|)"
+)
+_RE_INFORMATION_LINE = re.compile(r"\n\s*\*\*Information\*\*\s*\n")
+_RE_KB_OVERVIEW_TABLES = re.compile(
+    r"(?s:##? Views:\n\n\| \*\*Article Overview\*\* \|\n\| --- \|\n\|.*?\|)"
+    r"|(?s:Views:\n\n\| \*\*Article Overview\*\* \|\n\| --- \|\n\|.*?\|)"
+    r"|(?m:^\| Information \|\n)"
+)
+_RE_KNOWLEDGE_BASE_NOISE = re.compile(
+    r"\*\s*(?:Home|Knowledge Base - Home|KA-\d+)\s*\n"
+    r"|You’re offline.*?Knowledge Articles|Contoso, Ltd\.|BYU-Pathway Worldwide"
+    r"|Toggle navigation[.\w\s\*\+\-\:]+|Search Filter|Search\n|Knowledge Article Key:"
+    r"|You’re offline\. This is a read only version of the page\."
+)
+_RE_EMPTY_HEADER = re.compile(r"^#+\s*$", re.MULTILINE)
+_RE_COPY_LINK = re.compile(r"Copy link\S*")
+_RE_BROKEN_LINK = re.compile(r"\[([^\]]+)\]\.\n\n\((http[^\)]+)\) \(([^)]+)\)\.")
+_RE_BLANK_LINES = re.compile(r"\n\s*\n\s*\n")
+
+# Patterns used by has_markdown_tables
+_RE_TABLE_ROW = re.compile(r"\|.*\|.*\|")  # Table row with cells
+_RE_TABLE_SEPARATOR = re.compile(r"\|[\s-]*\|[\s-]*\|")  # Table header separator
+
+# Front matter removed by remove_existing_yaml_frontmatter: a '---' block opening the file and closed
+# by a '---' line
+_RE_YAML_FRONTMATTER = re.compile(r"\A---\n.*?^---\s", re.DOTALL | re.MULTILINE)
+
+# Markdown structure used by looks_like_markdown: ATX headings, list items and inline links
+_RE_MARKDOWN_STRUCTURE = re.compile(r"^#{1,6} \S|^[ \t]*[-*+] \S|\[[^\]\n]+\]\([^)\s]+\)", re.MULTILINE)
+
+# Selectors of the elements removed by clean_html, compiled once into a single selector so the
+# tree is walked once instead of once per selector
+_CLEAN_HTML_SELECTORS = (
+    '[aria-label="Search Filter"]',
+    '[aria-label*="Menu"]',
+    '[aria-label*="menu"]',
+    '[class*="menu"]',
+    '[class*="Menu"]',
+    '[role="region"]',
+    '[role="dialog"]',
+    ".sr-only",
+    ".navbar",
+    ".breadcrumb",
+    ".btn-toolbar",
+    ".skip-link",
+)
+_CLEAN_HTML_SELECTOR = soupsieve.compile(", ".join(_CLEAN_HTML_SELECTORS))
+
+# libyaml's C emitter when PyYAML was built with it, the pure-Python one otherwise
+YAML_DUMPER = getattr(yaml, "CDumper", yaml.Dumper)
+
+# Columns read from all_links.csv by associate_markdown_with_metadata, in unpacking order
+METADATA_CSV_COLUMNS = ("filename", "URL", "Section", "Subsection", "Title", "Role")
+
+# Columns of the parse failure sections appended to error.csv
+ERROR_CSV_FIELDS = ["filepath", "URL", "error_type", "timestamp"]
+
+# Extensions process_directory parses, matched case-insensitively
+_HTML_PDF_EXTS = frozenset((".html", ".pdf"))
+
+
+def positive_int_env(name, default):
+    """
+    Reads a count setting from the environment. Values that are not integers fall back to the
+    default and values below 1 are raised to 1, with a warning naming the variable either way.
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        logging.warning(f"{name}={value!r} is not an integer; using the default of {default}.")
+        return default
+    if number < 1:
+        logging.warning(f"{name}={number} must be at least 1; using 1.")
+        return 1
+    return number
+
+
+# Number of files parsed at the same time by process_directory
+PARSE_MAX_WORKERS = positive_int_env("PARSE_WORKERS", 8)
+
+# Number of LlamaParse requests in flight at once across the parsing threads
+LLAMAPARSE_CONCURRENCY = positive_int_env("LLAMAPARSE_CONCURRENCY", PARSE_MAX_WORKERS)
+_LLAMAPARSE_SLOTS = threading.BoundedSemaphore(LLAMAPARSE_CONCURRENCY)
+
+# Guard the stats counters and queued error rows, which are shared by the parsing threads
+_STATS_LOCK = threading.Lock()
+_ERROR_ROWS_LOCK = threading.Lock()
+
+# Exponential backoff between retries of a remote parse, with jitter so threads that fail
+# together do not retry together
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30
+# Empty LlamaParse results are usually short-lived, so their retries back off to at most 4s
+LLAMAPARSE_RETRY_MAX_DELAY = 4
+
+
+def retry_delay(attempt, max_delay=RETRY_MAX_DELAY):
+    """Returns the seconds to wait after the given failed attempt (counted from 0)."""
+    # The jitter only spreads retries out; it has no security role
+    return min(max_delay, RETRY_BASE_DELAY * 2**attempt) + random.uniform(0, 1)  # noqa: S311
+
+
+class MissingMetadataColumnsError(ValueError):
+    """Raised when the metadata CSV lacks columns that associate_markdown_with_metadata reads."""
+
+    def __init__(self, csv_path, missing):
+        super().__init__(f"{csv_path} is missing the metadata column(s): {', '.join(missing)}")
+
+
+@dataclass(slots=True)
+class ParseContext:
+    """State shared by every file that process_directory hands to process_file."""
+
+    out_folder: str
+    stats: dict
+    empty_llamaparse_files_counted: set
+    logger: DetailedLogger
+    # Failed files queued for error.csv, by section title
+    error_rows: dict = field(default_factory=dict)
+    # TXT files loaded as-is because they were already markdown, so never sent to LlamaParse
+    markdown_bypassed: set = field(default_factory=set)
+
+
+def increment_stat(stats, key):
+    """Increments a stats counter, starting it at zero if it is missing."""
+    with _STATS_LOCK:
+        stats[key] = stats.get(key, 0) + 1
+
+
+def init_parse_worker():
+    """Gives each parsing thread its own event loop for the LlamaParse client."""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    nest_asyncio.apply(loop)
+
 
 def clean_title(title):
     # replace enters with spaces
@@ -39,65 +212,47 @@ def clean_title(title):
 
 
 def is_empty_content(content):
-    content = content.replace("\n", "").replace(" ", "")
-    return not content
+    # Content made only of spaces and newlines is empty; strip checks that without copying the text
+    return not content.strip(" \n")
 
 
 def clean_markdown(text):
-    text = re.sub(r"```markdown+", "", text)
-
-    # Remove Markdown backticks
-    text = re.sub(r"```+", "", text)
-
-    # Remove inline code backticks (`text`)
-    text = re.sub(r"`+", "", text)
+    # Remove code fences (with their "markdown" language tag) and inline code backticks
+    text = _RE_BACKTICKS.sub("", text)
 
-    text = re.sub(r"\[Print\]\(javascript:window\.print\(\)\)", "", text)
+    # Remove the print link
+    text = _RE_PRINT_LINK.sub("", text)
 
     # Remove list of links with same anchors
-    text = re.sub(r"(?:(https?:\/\/[^\s]+)\s+){2,}", "", text)  # Remove repeated links
+    text = _RE_REPEATED_LINKS.sub("", text)  # Remove repeated links
 
     # Replace [link](#) and [link](url) with link text only
-    text = re.sub(r"\[([^\]]+)\]\(([^)]+)\)", r"\1", text)
-
-    # Remove lists of links to the same page (e.g., [All](#) [Web Pages](#))
-    text = re.sub(r"(\[([^\]]+)\]\(#\))+(?:\s|,)*", "", text)
-
-    # Regular expression to remove unnecessary text from
-    # knowledge base articles
-    # Remove specific table headers
-    text = re.sub(r"\| \*\*Bot Information\*\* \|\n\| --- \|", "", text)
-    text = re.sub(r"\| \*\*Information\*\* \|\n\| --- \|", "", text)
-    text = re.sub(r"Views:\n\n\|\s*Article Overview\s*\|\s*\n\|\s*---\s*\|\s*\n\|.*?\|", "", text, flags=re.DOTALL)
-    text = re.sub(r"\|\s*Information\s*\|\s*\n\|\s*---\s*\|\s*\n\|.*?\|", "", text, flags=re.DOTALL)
-    text = re.sub(r"\|\s*Bot Information\s*\|\s*\n\|\s*---\s*\|\s*\n\|.*?\|", "", text, flags=re.DOTALL)
-    text = re.sub(r"\n\s*\*\*Information\*\*\s*\n", "\n", text)
-    text = re.sub(r"##? Views:\n\n\| \*\*Article Overview\*\* \|\n\| --- \|\n\|.*?\|", "", text, flags=re.DOTALL)
-    text = re.sub(r"Views:\n\n\| \*\*Article Overview\*\* \|\n\| --- \|\n\|.*?\|", "", text, flags=re.DOTALL)
-    text = re.sub(r"^\| Information \|\n", "", text, flags=re.MULTILINE)
-    text = re.sub(r"\*\s*(Home|Knowledge Base - Home|KA-\d+)\s*\n", "", text)
-    text = re.sub(
-        r"(You’re offline.*?Knowledge Articles|Contoso, Ltd\.|BYU-Pathway Worldwide|Toggle navigation[.\w\s\*\+\-\:]+|Search Filter|Search\n|Knowledge Article Key:)",
-        "",
-        text,
-    )
-    text = re.sub(r"You’re offline\. This is a read only version of the page\.", "", text)
+    text = _RE_LINK.sub(r"\1", text)
+
+    # Remove lists of links to the same page (e.g., [All](#) [Web Pages](#)) and the
+    # knowledge base table headers
+    text = _RE_SAME_PAGE_LINKS_AND_KB_TABLES.sub("", text)
+
+    # Remove the remaining knowledge base headers, overview tables and navigation text
+    text = _RE_INFORMATION_LINE.sub("\n", text)
+    text = _RE_KB_OVERVIEW_TABLES.sub("", text)
+    text = _RE_KNOWLEDGE_BASE_NOISE.sub("", text)
 
     # Others regular expressions to remove unnecessary text
     # Remove empty headers
-    text = re.sub(r"^#+\s*$", "", text, flags=re.MULTILINE)
+    text = _RE_EMPTY_HEADER.sub("", text)
 
     # Remove text from WhatsApp navigation
-    text = re.sub(r"Copy link\S*", "Copy link", text)
+    text = _RE_COPY_LINK.sub("Copy link", text)
 
     # Remove text from the hall foundation menu
     # text = re.sub(r"(Skip to content|Menu|[*+-].*)\n", '', text, flags=re.MULTILINE)
 
     # Remove broken links
-    text = re.sub(r"\[([^\]]+)\]\.\n\n\((http[^\)]+)\) \(([^)]+)\)\.", r"\1 (\3).", text)
+    text = _RE_BROKEN_LINK.sub(r"\1 (\3).", text)
 
     # Remove consecutive blank lines
-    text = re.sub(r"\n\s*\n\s*\n", "\n\n", text)
+    text = _RE_BLANK_LINES.sub("\n\n", text)
 
     return text
 
@@ -110,6 +265,7 @@ def clean_html(soup):
 
     # Remove unnecessary elements
     for tag in soup([
+        "title",
         "head",
         "style",
         "script",
@@ -125,26 +281,9 @@ def clean_html(soup):
     ]):
         tag.decompose()
 
-    # Create selectors to remove elements
-    selectors = [
-        '[aria-label="Search Filter"]',
-        '[aria-label*="Menu"]',
-        '[aria-label*="menu"]',
-        '[class*="menu"]',
-        '[class*="Menu"]',
-        '[role="region"]',
-        '[role="dialog"]',
-        ".sr-only",
-        ".navbar",
-        ".breadcrumb",
-        ".btn-toolbar",
-        ".skip-link",
-    ]
-
     # Remove elements by selectors
-    for selector in selectors:
-        for tag in soup.select(selector):
-            tag.decompose()
+    for tag in _CLEAN_HTML_SELECTOR.select(soup):
+        tag.decompose()
     # Determine the content container (main or body)
     content = soup.main or soup.body
 
@@ -174,7 +313,7 @@ def clean_text(text):
         return ""
 
     # Replace null characters
-    text = re.sub(r"\x00", "th", text)
+    text = text.replace("\x00", "th")
 
     # Remove leading and trailing whitespace
     text = text.strip()
@@ -184,7 +323,7 @@ def clean_text(text):
         text = text[1:-1].strip()
 
     # Remove leading and trailing quotes (both single and double)
-    if (text.startswith("'") and text.endswith("'")) or (text.startswith('"') and text.endswith('"')):
+    if text[:1] in ("'", '"') and text.endswith(text[0]):
         text = text[1:-1].strip()
         text = text.replace("'", "").replace(",", " |").replace("\n", " ")
 
@@ -221,6 +360,9 @@ def parse_pdf_to_txt(filepath, out_folder):
     except Exception as e:
         print("Another exception", e)
         return "Error"
+    finally:
+        # Release the request, and the PDF bytes it holds, before building the markdown
+        del files, req
 
     simple_md = unstructured_elements_to_markdown(resp.elements)
     simple_md = clean_text(simple_md)
@@ -249,15 +391,16 @@ def convert_html_to_markdown(file_path, out_folder):
     with open(file_path, encoding="utf-8") as f:
         html_content = f.read()
 
-    soup = BeautifulSoup(html_content, "html.parser")
+    soup = BeautifulSoup(html_content, HTML_PARSER, parse_only=HTML_STRAINER)
     cleaned_soup = clean_html(soup)
 
-    title = soup.contents[0]
-    title_tag = title.text if title.name == "title" else ""
+    # A page with nothing the strainer keeps (e.g. a frameset) leaves an empty soup
+    title = soup.contents[0] if soup.contents else None
+    title_tag = title.text if title is not None and title.name == "title" else ""
     if title_tag:
         title.decompose()
 
-    markdown_content = md(str(cleaned_soup), heading_style="ATX")
+    markdown_content = MARKDOWN_CONVERTER.convert_soup(cleaned_soup)
     markdown_content = re.sub(r"\n{2,}", "\n\n", markdown_content)
 
     file_out = os.path.join(out_folder, "from_html", os.path.basename(file_path).replace(".html", ".txt"))
@@ -325,76 +468,70 @@ def create_file_extractor(parse_type="pdf"):
 
 def has_markdown_tables(content):
     """Check if content contains markdown tables"""
-    table_patterns = [
-        r"\|.*\|.*\|",  # Table row with cells
-        r"\|[\s-]*\|[\s-]*\|",  # Table header separator
-    ]
-    return all(re.search(pattern, content, re.MULTILINE) for pattern in table_patterns)
+    # Most documents have no pipe at all, which rules out a table without running the regexes
+    if "|" not in content:
+        return False
+    return _RE_TABLE_ROW.search(content) is not None and _RE_TABLE_SEPARATOR.search(content) is not None
+
+
+def looks_like_markdown(content):
+    """Check if content already has markdown structure (headings, list items or links)"""
+    return _RE_MARKDOWN_STRUCTURE.search(content) is not None
 
 
-def parse_txt_to_md(
-    file_path, file_extension, stats, empty_llamaparse_files_counted, detailed_log_path, title_tag="", url=None
-):
+def parse_txt_to_md(file_path, file_extension, ctx, title_tag="", url=None):
     """
     Parses a .txt file to a Markdown (.md) file using LlamaParse, with detailed logging.
     """
-    import datetime
-    import json
-
     with open(file_path, encoding="utf-8") as f:
         content = f.read()
 
     log_entry = {
-        "timestamp": datetime.datetime.now().isoformat(),
         "stage": "parse_txt_to_md",
         "filepath": file_path,
         "status": "START",
         "message": "Starting TXT to MD parsing.",
     }
-    if detailed_log_path:
-        with open(detailed_log_path, "a") as f:
-            f.write(json.dumps(log_entry) + "\n")
-
-    if not has_markdown_tables(content):
-        documents = SimpleDirectoryReader(
-            input_files=[file_path], file_extractor=create_file_extractor(file_extension)
-        ).load_data()
+    ctx.logger.emit(log_entry)
+
+    has_tables = has_markdown_tables(content)
+    # Text converted from HTML is already markdown; only send it to LlamaParse when it has no structure
+    if not has_tables and file_extension == ".html" and looks_like_markdown(content):
+        documents = SimpleDirectoryReader(input_files=[file_path]).load_data()
+        ctx.markdown_bypassed.add(file_path)
+        increment_stat(ctx.stats, "documents_markdown_bypassed")
+        log_entry = {
+            "stage": "parse_txt_to_md",
+            "filepath": file_path,
+            "status": "MARKDOWN_BYPASS",
+            "message": "Loaded TXT file directly without LlamaParse because it is already markdown.",
+            "url": url,
+        }
+        ctx.logger.emit(log_entry)
+    elif not has_tables:
+        with _LLAMAPARSE_SLOTS:
+            documents = SimpleDirectoryReader(
+                input_files=[file_path], file_extractor=create_file_extractor(file_extension)
+            ).load_data()
         log_entry = {
-            "timestamp": datetime.datetime.now().isoformat(),
             "stage": "parse_txt_to_md",
             "filepath": file_path,
             "status": "LLAMAPARSE_USED",
             "message": "Used LlamaParse extractor for TXT file.",
         }
-        if detailed_log_path:
-            with open(detailed_log_path, "a") as f:
-                f.write(json.dumps(log_entry) + "\n")
+        ctx.logger.emit(log_entry)
     else:
         documents = SimpleDirectoryReader(input_files=[file_path]).load_data()
         log_entry = {
-            "timestamp": datetime.datetime.now().isoformat(),
             "stage": "parse_txt_to_md",
             "filepath": file_path,
             "status": "DIRECT_LOAD",
             "message": "Loaded TXT file directly without LlamaParse.",
             "url": url,  # Include the URL in the log entry
         }
-        if detailed_log_path:
-            with open(detailed_log_path, "a") as f:
-                f.write(json.dumps(log_entry) + "\n")
-
-    final_content = "\n\n".join([doc.text for doc in documents])
-
-    # If content from LlamaParse is empty, revert to original content
-    if is_empty_content(final_content):
-        final_content = content
-
-    # If the final content (even after reverting) is empty, then it's a failure
-    if is_empty_content(final_content):
-        print(f"Final content for {os.path.basename(file_path)} is empty. Moving to error.")
-        return True  # True indicates failure/empty
+        ctx.logger.emit(log_entry)
 
-    final_content = "\n\n".join([doc.text for doc in documents])
+    final_content = "\n\n".join(doc.text for doc in documents)
 
     # If content from LlamaParse is empty, revert to original content
     if is_empty_content(final_content):
@@ -416,18 +553,15 @@ def parse_txt_to_md(
         f.write(final_content)
         print(f"Parsed TXT to MD and saved to: {out_name}")
 
-    stats["md_files_generated"] += 1
+    increment_stat(ctx.stats, "md_files_generated")
 
     log_entry = {
-        "timestamp": datetime.datetime.now().isoformat(),
         "stage": "parse_txt_to_md",
         "filepath": file_path,
         "status": "FINISHED",
         "message": f"Finished TXT to MD parsing. Empty: {is_empty_content(final_content)}",
     }
-    if detailed_log_path:
-        with open(detailed_log_path, "a") as f:
-            f.write(json.dumps(log_entry) + "\n")
+    ctx.logger.emit(log_entry)
 
     return False
 
@@ -447,65 +581,79 @@ def associate_markdown_with_metadata(markdown_dirs, csv_path, excluded_domains):
     # Read the CSV file and store the file paths, URLs, headings, and subheadings in a dictionary
     file_metadata_mapping = {}
     with open(csv_path, newline="", encoding="utf-8") as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            # Extract the filename without the extension and use it as the key
-            filename_with_ext = os.path.basename(row["filename"])
-            filename_without_ext = os.path.splitext(filename_with_ext)[0]
-
-            # Store metadata using filename without extension as the key
-            file_metadata_mapping[filename_without_ext] = {
-                "url": row["URL"],
-                "heading": clean_text(row["Section"]),
-                "subheading": (clean_text(row["Subsection"]) if clean_text(row["Subsection"]) != "Missing" else ""),
-                "title": clean_text(row["Title"]),
-                "role": row["Role"],
-            }
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header is not None:
+            missing = [column for column in METADATA_CSV_COLUMNS if column not in header]
+            if missing:
+                raise MissingMetadataColumnsError(csv_path, missing)
+            # Rows are plain lists; resolve the column positions once from the header
+            get_fields = operator.itemgetter(*(header.index(column) for column in METADATA_CSV_COLUMNS))
+            width = len(header)
+            for row in reader:
+                if not row:  # blank line
+                    continue
+                if len(row) < width:
+                    # Short rows leave their trailing fields empty, as csv.DictReader would
+                    row += [""] * (width - len(row))
+                filename, url, section, subsection, title, role = get_fields(row)
+                # Extract the filename without the extension and use it as the key
+                filename_with_ext = os.path.basename(filename)
+                filename_without_ext = os.path.splitext(filename_with_ext)[0]
+
+                # Store metadata using filename without extension as the key
+                subheading = clean_text(subsection)
+                file_metadata_mapping[filename_without_ext] = {
+                    "url": url,
+                    "heading": clean_text(section),
+                    "subheading": subheading if subheading != "Missing" else "",
+                    "title": clean_text(title),
+                    "role": role,
+                }
 
     # Now go through the markdown files in each directory and associate them with the metadata
     markdown_metadata_mapping = {}
     # List to save files without metadata
     no_metadata = []
+    # Set for constant-time domain lookups
+    excluded_domains = set(excluded_domains)
 
     for markdown_path in all_files:
         # Get the markdown filename without the extension
         markdown_filename_without_ext = os.path.splitext(os.path.basename(markdown_path))[0]
 
         # Check if the filename matches any entry in the CSV dictionary
-        if markdown_filename_without_ext in file_metadata_mapping:
+        metadata = file_metadata_mapping.get(markdown_filename_without_ext)
+        if metadata is not None:
             # Store the path relative to the directory
             # full_path = os.path.join(markdown_dir, markdown_filename)
-            markdown_metadata_mapping[markdown_path] = file_metadata_mapping[markdown_filename_without_ext]
-            # open the file, and read if the first line begins with "title: "
-            with open(markdown_path, encoding="utf-8") as file:
-                lines = file.readlines()
-
-            if len(lines) == 0:
-                continue
-            # Revisar si la primera línea contiene el título
-            first_line = lines[0].strip()
-
-            # get the url from the metadata
-            url = markdown_metadata_mapping[markdown_path]["url"]
-            if first_line.startswith("title: "):
-                # Extraer el título de la primera línea
-                title = first_line.replace("title: ", "")
-                if get_domain(url) not in excluded_domains:
-                    markdown_metadata_mapping[markdown_path]["title_tag"] = title
-
-                # Eliminar la primera línea (la que contiene el título)
-                lines = lines[1:]
-
-                # Guardar el archivo sin la primera línea
-                with open(markdown_path, "w", encoding="utf-8") as file:
-                    file.writelines(lines)
-
-            # clean the markdown file and save it
-            with open(markdown_path, encoding="utf-8") as file:
+            markdown_metadata_mapping[markdown_path] = metadata
+            # open the file once, and read if the first line begins with "title: "
+            with open(markdown_path, "r+", encoding="utf-8") as file:
                 content = file.read()
+
+                if not content:
+                    continue
+                # Revisar si la primera línea contiene el título
+                first_line, _, rest = content.partition("\n")
+                first_line = first_line.strip()
+
+                # get the url from the metadata
+                url = metadata["url"]
+                if first_line.startswith("title: "):
+                    # Extraer el título de la primera línea
+                    title = first_line.replace("title: ", "")
+                    if get_domain(url) not in excluded_domains:
+                        metadata["title_tag"] = title
+
+                    # Eliminar la primera línea (la que contiene el título)
+                    content = rest
+
+                # clean the markdown and save it in place
                 content = clean_markdown(content)
-            with open(markdown_path, "w", encoding="utf-8") as file:
+                file.seek(0)
                 file.write(content)
+                file.truncate()
 
         else:
             print(f"No metadata found for {markdown_path}. Skipping.")
@@ -516,8 +664,7 @@ def associate_markdown_with_metadata(markdown_dirs, csv_path, excluded_domains):
     with open(no_metadata_csv_path, mode="w", newline="", encoding="utf-8") as nm_file:
         writer = csv.writer(nm_file)
         writer.writerow(["markdown_path"])
-        for nm_path in no_metadata:
-            writer.writerow([nm_path])
+        writer.writerows([nm_path] for nm_path in no_metadata)
 
     print("\nMarkdown files and their metadata:")
     for path, meta in markdown_metadata_mapping.items():
@@ -529,10 +676,11 @@ def associate_markdown_with_metadata(markdown_dirs, csv_path, excluded_domains):
 def remove_existing_yaml_frontmatter(content):
     """
     Removes existing YAML front matter from the given content.
-    Assumes that front matter is enclosed between '---' markers.
+    Assumes that front matter is enclosed between '---' markers at the start of the content.
     """
-    yaml_pattern = re.compile(r"^---[\s\S]*?---\s", re.MULTILINE)
-    return re.sub(yaml_pattern, "", content, count=1)
+    if not content.startswith("---"):
+        return content
+    return _RE_YAML_FRONTMATTER.sub("", content, count=1)
 
 
 def attach_metadata_to_markdown_directories(markdown_dirs, metadata_dict):
@@ -545,33 +693,60 @@ def attach_metadata_to_markdown_directories(markdown_dirs, metadata_dict):
     """
     # Loop through each directory provided
 
-    all_files = get_files(markdown_dirs, ignored="error/")
+    all_files = get_files(markdown_dirs, ignored="error/", extensions=".md")
 
     # Loop through each markdown file in the directory
     for file_path in all_files:
-        if file_path.endswith(".md"):
-            if file_path in metadata_dict:  # Check if full path is in metadata_dict
-                # Extract metadata
-                metadata = metadata_dict[file_path]
-
-                # Open the markdown file, remove existing YAML front matter, and prepend new metadata
-                with open(file_path, "r+", encoding="utf-8") as file:
-                    content = file.read()
-                    # Remove any existing front matter
-                    content_without_frontmatter = remove_existing_yaml_frontmatter(content)
-                    # Prepare the new YAML front matter
-                    yaml_metadata = yaml.dump(metadata, default_flow_style=False, allow_unicode=True)
-                    front_matter = f"---\n{yaml_metadata}---\n"
-                    # Write the new front matter and content back to the file
-                    file.seek(0, 0)
-                    file.write(front_matter + content_without_frontmatter)
-                    file.truncate()  # Ensure the file doesn't retain any old content beyond the new content
-                print(f"Metadata attached to {file_path}")
-            else:
-                print(f"No metadata found for {file_path}. Skipping.")
+        if file_path in metadata_dict:  # Check if full path is in metadata_dict
+            # Extract metadata
+            metadata = metadata_dict[file_path]
+
+            # Open the markdown file, remove existing YAML front matter, and prepend new metadata
+            with open(file_path, encoding="utf-8") as file:
+                content = file.read()
+            # Remove any existing front matter
+            content_without_frontmatter = remove_existing_yaml_frontmatter(content)
+            # Prepare the new YAML front matter
+            yaml_metadata = yaml.dump(metadata, Dumper=YAML_DUMPER, default_flow_style=False, allow_unicode=True)
+            front_matter = f"---\n{yaml_metadata}---\n"
+            # Write the new file next to the old one and swap it in, so a crash never leaves a torn file
+            tmp_path = file_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                file.write(front_matter)
+                file.write(content_without_frontmatter)
+            os.replace(tmp_path, file_path)
+            print(f"Metadata attached to {file_path}")
+        else:
+            print(f"No metadata found for {file_path}. Skipping.")
 
 
-def process_file(file_path, out_folder, stats, empty_llamaparse_files_counted, detailed_log_path, url=None):
+def record_error_row(error_rows, section, file_path, url, error_type):
+    """
+    Queues a failed file under the given section title of the error.csv report.
+    """
+    row = [file_path, url if url else "N/A", error_type, datetime.datetime.now().isoformat()]
+    with _ERROR_ROWS_LOCK:
+        error_rows.setdefault(section, []).append(row)
+
+
+def write_error_sections(error_rows):
+    """
+    Appends the queued sections, each with a single header, to the error.csv report under DATA_PATH.
+    """
+    if not error_rows:
+        return
+    error_csv_path = os.path.join(os.getenv("DATA_PATH"), "error", "error.csv")
+    os.makedirs(os.path.dirname(error_csv_path), exist_ok=True)
+
+    with open(error_csv_path, "a", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        for section, rows in error_rows.items():
+            f.write(f"\n{section}\n")
+            writer.writerow(ERROR_CSV_FIELDS)
+            writer.writerows(rows)
+
+
+def process_file(file_path, ctx, url=None):
     """
     Processes a file based on its extension: PDF or HTML.
     """
@@ -583,99 +758,69 @@ def process_file(file_path, out_folder, stats, empty_llamaparse_files_counted, d
 
     if file_path.lower().endswith(".pdf"):
         # Handle PDF file
-        stats["documents_sent_to_llamaparse"] += 1
-        stats["total_pdfs_attempted"] = stats.get("total_pdfs_attempted", 0) + 1
+        increment_stat(ctx.stats, "documents_sent_to_llamaparse")
+        increment_stat(ctx.stats, "total_pdfs_attempted")
         log_entry = {
-            "timestamp": datetime.datetime.now().isoformat(),
             "stage": "parse",
             "filepath": file_path,
             "status": "PDF_PROCESSING_ATTEMPT",
             "reason": "Attempting to process PDF file.",
         }
-        if detailed_log_path:
-            with open(detailed_log_path, "a") as f:
-                f.write(json.dumps(log_entry) + "\n")
+        ctx.logger.emit(log_entry)
         for i in range(3):
             if i > 0:
                 log_entry = {
-                    "timestamp": datetime.datetime.now().isoformat(),
                     "stage": "parse",
                     "filepath": file_path,
                     "status": "PDF_RETRY",
                     "reason": f"Retrying PDF processing (attempt {i + 1}).",
                 }
-                if detailed_log_path:
-                    with open(detailed_log_path, "a") as f:
-                        f.write(json.dumps(log_entry) + "\n")
-            txt_file_path = parse_pdf_to_txt(file_path, out_folder)
+                ctx.logger.emit(log_entry)
+            txt_file_path = parse_pdf_to_txt(file_path, ctx.out_folder)
             if txt_file_path != "Error":
                 log_entry = {
-                    "timestamp": datetime.datetime.now().isoformat(),
                     "stage": "parse",
                     "filepath": file_path,
                     "status": "PDF_TO_TXT_SUCCESS",
                     "reason": "Successfully converted PDF to TXT.",
                 }
-                if detailed_log_path:
-                    with open(detailed_log_path, "a") as f:
-                        f.write(json.dumps(log_entry) + "\n")
-                stats["pdfs_successfully_parsed"] = stats.get("pdfs_successfully_parsed", 0) + 1
+                ctx.logger.emit(log_entry)
+                increment_stat(ctx.stats, "pdfs_successfully_parsed")
                 break
             if url:
                 print(f"Error parsing PDF file (URL: {url}). Retrying...")
             else:
                 print("Error parsing PDF file. Retrying...")
             log_entry = {
-                "timestamp": datetime.datetime.now().isoformat(),
                 "stage": "parse",
                 "filepath": file_path,
                 "status": "PDF_TO_TXT_FAILED",
                 "reason": "Failed to convert PDF to TXT. Retrying.",
             }
-            if detailed_log_path:
-                with open(detailed_log_path, "a") as f:
-                    f.write(json.dumps(log_entry) + "\n")
-            time.sleep(4)
+            ctx.logger.emit(log_entry)
+            if i < 2:  # no point waiting after the last attempt
+                time.sleep(retry_delay(i))
 
         # If PDF parsing failed after all retries
         if txt_file_path == "Error":
-            import pandas as pd
-
-            # Log to error.csv
-            error_data = [{
-                "filepath": file_path,
-                "URL": url if url else "N/A",
-                "error_type": "PDF_PARSING_FAILED",
-                "timestamp": datetime.datetime.now().isoformat()
-            }]
-            error_df = pd.DataFrame(error_data)
-            data_path = os.getenv("DATA_PATH")
-            error_csv_path = os.path.join(data_path, "error", "error.csv")
-            os.makedirs(os.path.dirname(error_csv_path), exist_ok=True)
-
-            with open(error_csv_path, "a") as f:
-                f.write("\nPDF Parsing Failures\n")
-            error_df.to_csv(error_csv_path, mode="a", index=False, header=True)
+            # Queue the failure for error.csv
+            record_error_row(ctx.error_rows, "PDF Parsing Failures", file_path, url, "PDF_PARSING_FAILED")
 
             # Move file to error folder in the crawl directory
             error_folder = os.path.join(os.path.dirname(file_path), "error")
-            os.makedirs(error_folder, exist_ok=True)
             error_file_path = os.path.join(error_folder, os.path.basename(file_path))
-            shutil.move(file_path, error_file_path)
+            os.replace(file_path, error_file_path)  # same filesystem, so a single rename
 
             # Update stats and log
-            stats["documents_failed_after_retries"] += 1
-            stats["pdfs_failed"] = stats.get("pdfs_failed", 0) + 1
+            increment_stat(ctx.stats, "documents_failed_after_retries")
+            increment_stat(ctx.stats, "pdfs_failed")
             log_entry = {
-                "timestamp": datetime.datetime.now().isoformat(),
                 "stage": "parse",
                 "filepath": file_path,
                 "status": "PDF_PARSING_FAILED_MOVED_TO_ERROR",
                 "reason": "PDF parsing failed after 3 retries. File moved to error folder.",
             }
-            if detailed_log_path:
-                with open(detailed_log_path, "a") as f:
-                    f.write(json.dumps(log_entry) + "\n")
+            ctx.logger.emit(log_entry)
 
             if url:
                 print(f"PDF parsing failed (URL: {url}). Moved to {error_folder}")
@@ -684,205 +829,202 @@ def process_file(file_path, out_folder, stats, empty_llamaparse_files_counted, d
             return  # Continue to next file
 
     elif file_path.lower().endswith(".html"):
-        # Handle HTML file
-        stats["documents_sent_to_llamaparse"] += 1
+        # Handle HTML file; it is counted as sent to LlamaParse once it is known not to be bypassed
         log_entry = {
-            "timestamp": datetime.datetime.now().isoformat(),
             "stage": "parse",
             "filepath": file_path,
             "status": "HTML_PROCESSING_ATTEMPT",
             "reason": "Attempting to process HTML file.",
         }
-        if detailed_log_path:
-            with open(detailed_log_path, "a") as f:
-                f.write(json.dumps(log_entry) + "\n")
+        ctx.logger.emit(log_entry)
         for i in range(3):
             if i > 0:
                 log_entry = {
-                    "timestamp": datetime.datetime.now().isoformat(),
                     "stage": "parse",
                     "filepath": file_path,
                     "status": "HTML_RETRY",
                     "reason": f"Retrying HTML processing (attempt {i + 1}).",
                 }
-                if detailed_log_path:
-                    with open(detailed_log_path, "a") as f:
-                        f.write(json.dumps(log_entry) + "\n")
-            txt_file_path, title_tag = convert_html_to_markdown(file_path, out_folder)
+                ctx.logger.emit(log_entry)
+            txt_file_path, title_tag = convert_html_to_markdown(file_path, ctx.out_folder)
             if title_tag != "Error parsing.":
                 log_entry = {
-                    "timestamp": datetime.datetime.now().isoformat(),
                     "stage": "parse",
                     "filepath": file_path,
                     "status": "HTML_TO_TXT_SUCCESS",
                     "reason": "Successfully converted HTML to TXT.",
                 }
-                if detailed_log_path:
-                    with open(detailed_log_path, "a") as f:
-                        f.write(json.dumps(log_entry) + "\n")
+                ctx.logger.emit(log_entry)
                 break
             print("Error converting HTML file. Retrying...")
             log_entry = {
-                "timestamp": datetime.datetime.now().isoformat(),
                 "stage": "parse",
                 "filepath": file_path,
                 "status": "HTML_TO_TXT_FAILED",
                 "reason": "Failed to convert HTML to TXT. Retrying.",
             }
-            if detailed_log_path:
-                with open(detailed_log_path, "a") as f:
-                    f.write(json.dumps(log_entry) + "\n")
-            time.sleep(4)
+            ctx.logger.emit(log_entry)
 
         # If HTML parsing failed after all retries
         if title_tag == "Error parsing.":
-            import pandas as pd
-
-            # Log to error.csv
-            error_data = [{
-                "filepath": file_path,
-                "URL": url if url else "N/A",
-                "error_type": "HTML_PARSING_FAILED",
-                "timestamp": datetime.datetime.now().isoformat()
-            }]
-            error_df = pd.DataFrame(error_data)
-            data_path = os.getenv("DATA_PATH")
-            error_csv_path = os.path.join(data_path, "error", "error.csv")
-            os.makedirs(os.path.dirname(error_csv_path), exist_ok=True)
-
-            with open(error_csv_path, "a") as f:
-                f.write("\nHTML Parsing Failures\n")
-            error_df.to_csv(error_csv_path, mode="a", index=False, header=True)
+            # Queue the failure for error.csv
+            record_error_row(ctx.error_rows, "HTML Parsing Failures", file_path, url, "HTML_PARSING_FAILED")
 
             # Move file to error folder in the crawl directory
             error_folder = os.path.join(os.path.dirname(file_path), "error")
-            os.makedirs(error_folder, exist_ok=True)
             error_file_path = os.path.join(error_folder, os.path.basename(file_path))
-            shutil.move(file_path, error_file_path)
+            os.replace(file_path, error_file_path)  # same filesystem, so a single rename
 
             # Update stats and log
-            stats["documents_failed_after_retries"] += 1
+            increment_stat(ctx.stats, "documents_failed_after_retries")
             log_entry = {
-                "timestamp": datetime.datetime.now().isoformat(),
                 "stage": "parse",
                 "filepath": file_path,
                 "status": "HTML_PARSING_FAILED_MOVED_TO_ERROR",
                 "reason": "HTML parsing failed after 3 retries. File moved to error folder.",
             }
-            if detailed_log_path:
-                with open(detailed_log_path, "a") as f:
-                    f.write(json.dumps(log_entry) + "\n")
+            ctx.logger.emit(log_entry)
 
             print(f"HTML parsing failed. Moved to {error_folder}")
             return  # Continue to next file
 
     if title_tag != "Error parsing." and txt_file_path != "Error":
         log_entry = {
-            "timestamp": datetime.datetime.now().isoformat(),
             "stage": "parse",
             "filepath": file_path,
             "status": "LLAMAPARSE_ATTEMPT",
             "reason": "Attempting LlamaParse conversion.",
         }
-        if detailed_log_path:
-            with open(detailed_log_path, "a") as f:
-                f.write(json.dumps(log_entry) + "\n")
+        ctx.logger.emit(log_entry)
         # try a maximum of 3 times to parse the txt file to md
         for i in range(3):
-            is_empty = parse_txt_to_md(
-                txt_file_path, file_extension, stats, empty_llamaparse_files_counted, detailed_log_path, title_tag, url
-            )
+            is_empty = parse_txt_to_md(txt_file_path, file_extension, ctx, title_tag, url)
+            bypassed = txt_file_path in ctx.markdown_bypassed
+            if i == 0 and file_extension.lower() == ".html" and not bypassed:
+                increment_stat(ctx.stats, "documents_sent_to_llamaparse")
             if not is_empty:
                 # remove the txt file
                 os.remove(txt_file_path)
-                stats["documents_successful_after_retries"] += 1
+                increment_stat(ctx.stats, "documents_successful_after_retries")
                 log_entry = {
-                    "timestamp": datetime.datetime.now().isoformat(),
                     "stage": "parse",
                     "filepath": file_path,
                     "status": "LLAMAPARSE_SUCCESS_OR_RETRY_SUCCEEDED",
                     "reason": "LlamaParse produced content or retry was successful.",
                 }
-                if detailed_log_path:
-                    with open(detailed_log_path, "a") as f:
-                        f.write(json.dumps(log_entry) + "\n")
+                ctx.logger.emit(log_entry)
                 return
             print("Error parsing TXT file to MD. Retrying...")
             log_entry = {
-                "timestamp": datetime.datetime.now().isoformat(),
                 "stage": "parse",
                 "filepath": file_path,
                 "status": "LLAMAPARSE_EMPTY_RETRY",
                 "reason": f"LlamaParse returned empty content. Retrying (attempt {i + 1}).",
             }
-            if detailed_log_path:
-                with open(detailed_log_path, "a") as f:
-                    f.write(json.dumps(log_entry) + "\n")
-            time.sleep(4)
+            ctx.logger.emit(log_entry)
+            if i < 2:  # no point waiting after the last attempt
+                time.sleep(retry_delay(i, max_delay=LLAMAPARSE_RETRY_MAX_DELAY))
 
-    stats["documents_failed_after_retries"] += 1
+    increment_stat(ctx.stats, "documents_failed_after_retries")
     log_entry = {
-        "timestamp": datetime.datetime.now().isoformat(),
         "stage": "parse",
         "filepath": file_path,
         "status": "FAILED_AFTER_ALL_RETRIES",
         "reason": "Document could not be processed after all LlamaParse retries.",
     }
-    if detailed_log_path:
-        with open(detailed_log_path, "a") as f:
-            f.write(json.dumps(log_entry) + "\n")
+    ctx.logger.emit(log_entry)
     # move the txt file to the error folder
-    error_folder = os.path.join(out_folder, "error")
-    os.rename(txt_file_path, os.path.join(error_folder, os.path.basename(txt_file_path)))  # moving the file
+    error_folder = os.path.join(ctx.out_folder, "error")
+    os.replace(txt_file_path, os.path.join(error_folder, os.path.basename(txt_file_path)))  # moving the file
     print(f"Error parsing TXT file to MD. Moved to {error_folder}")
 
 
-def process_directory(origin_path, out_folder, stats, empty_llamaparse_files_counted, detailed_log_path):
+def iter_html_and_pdf_files(directory):
     """
-    Processes all HTML and PDF files in the specified directory.
+    Yields (path, filename without extension) for every HTML and PDF file under the directory,
+    without descending into error folders.
     """
-    import csv
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name != "error":
+                    yield from iter_html_and_pdf_files(entry.path)
+            else:
+                stem, ext = os.path.splitext(entry.name)
+                if ext.lower() in _HTML_PDF_EXTS and entry.is_file(follow_symlinks=False):
+                    yield entry.path, stem
 
+
+def process_directory(origin_path, out_folder, stats, empty_llamaparse_files_counted, detailed_log_path):
+    """
+    Processes all HTML and PDF files in the specified directory, several files at a time.
+    """
     # Load all_links.csv for URL lookup
     all_links_path = os.path.join(os.path.dirname(origin_path), "all_links.csv")
     file_url_map = {}
     if os.path.exists(all_links_path):
-        with open(all_links_path, newline="", encoding="utf-8") as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                filename_with_ext = os.path.basename(row["filename"])
-                filename_without_ext = os.path.splitext(filename_with_ext)[0]
-                file_url_map[filename_without_ext] = row.get("URL")
-    files_processed_by_directory = 0
-    for root, _dirs, files in os.walk(origin_path):
-        if "error" in root:
-            continue
-        for file in files:
-            if file.lower().endswith((".html", ".pdf")):
-                file_path = os.path.join(root, file)
-                filename_without_ext = os.path.splitext(os.path.basename(file_path))[0]
-                url = file_url_map.get(filename_without_ext)
-                print(f"Processing file: {file_path} (URL: {url})")
-                process_file(file_path, out_folder, stats, empty_llamaparse_files_counted, detailed_log_path, url=url)
-                files_processed_by_directory += 1
-    return files_processed_by_directory
+        links_df = pd.read_csv(
+            all_links_path, usecols=["filename", "URL"], dtype=str, keep_default_na=False, encoding="utf-8"
+        )
+        # Filename without directory and extension, computed for the whole column at once
+        stems = links_df["filename"].str.rsplit("/", n=1).str[-1].str.rsplit(".", n=1).str[0]
+        file_url_map = dict(zip(stems, links_df["URL"]))
+
+    # Collect the files up front, since failed files are moved into error folders while they are processed
+    file_jobs = [
+        (file_path, file_url_map.get(filename_without_ext))
+        for file_path, filename_without_ext in iter_html_and_pdf_files(origin_path)
+    ]
+
+    # Create the error folders that failed files are moved into once, rather than on every failure
+    for directory in {os.path.dirname(file_path) for file_path, _ in file_jobs}:
+        os.makedirs(os.path.join(directory, "error"), exist_ok=True)
+    os.makedirs(os.path.join(out_folder, "error"), exist_ok=True)
+
+    def process_job(job):
+        file_path, url = job
+        print(f"Processing file: {file_path} (URL: {url})")
+        process_file(file_path, ctx, url=url)
+
+    # Files are parsed concurrently: the work is dominated by waiting on the remote parsing services
+    with DetailedLogger(detailed_log_path) as logger:
+        ctx = ParseContext(out_folder, stats, empty_llamaparse_files_counted, logger)
+        try:
+            with ThreadPoolExecutor(max_workers=PARSE_MAX_WORKERS, initializer=init_parse_worker) as executor:
+                futures = [executor.submit(process_job, job) for job in file_jobs]
+                # Surface failures as soon as any file raises, not in submission order
+                for future in as_completed(futures):
+                    future.result()
+        finally:
+            # Failed files are reported in error.csv once the whole directory is done
+            write_error_sections(ctx.error_rows)
+    return len(file_jobs)
+
+
+def extract_html_title(content):
+    """Gets the text of the first <title> in raw HTML bytes, or an empty string if there is none."""
+    match = _RE_HTML_TITLE.search(content)
+    if match:
+        return html.unescape(match.group(1).decode("utf-8", errors="replace"))
+    # Let lxml recover titles the pattern cannot see, such as an unclosed <title>
+    soup = BeautifulSoup(content, HTML_PARSER, parse_only=TITLE_STRAINER)
+    return (soup.title.string if soup.title else None) or ""
 
 
 def add_titles_tag(input_directory, out_folder):
-    all_files = get_files(input_directory)
-    # save only html files
-    html_files = [file for file in all_files if file.endswith(".html")]
-    # ignore the error folder
-    html_files = [file for file in html_files if "error" not in file]
-    out_files = get_files(out_folder)
+    # save only html files, ignoring the error folder
+    html_files = [file for file in get_files(input_directory, extensions=".html") if "error" not in file]
+    # index the markdown files by filename; the first one found wins, as with the former list scan
+    md_files_by_name = {}
+    for md_path in get_files(out_folder):
+        md_files_by_name.setdefault(os.path.basename(md_path), md_path)
 
     print(f"=== input directory: {input_directory}===")
     # Load a soup object from each html, get the title, and add it to the first line of the markdown file
     for file_path in html_files:
-        with open(file_path, encoding="utf-8") as file:
+        with open(file_path, "rb") as file:
             content = file.read()
-        soup = BeautifulSoup(content, "html.parser")
-        title = soup.title.string if soup.title else ""
+        title = extract_html_title(content)
         title = clean_title(title)
 
         if not title:
@@ -892,19 +1034,17 @@ def add_titles_tag(input_directory, out_folder):
 
         # get the markdown file by filename
         filename = os.path.basename(file_path).replace(".html", ".md")
-        md_file = [file for file in out_files if filename in file]
+        md_file = md_files_by_name.get(filename)
 
-        if len(md_file) == 0:
+        if md_file is None:
             print(f"Markdown file not found for {filename}")
             continue
-        # open the file
-        with open(md_file[0], encoding="utf-8") as file:
-            content = file.read()
-
-        with open(md_file[0], "w", encoding="utf-8") as f:
-            f.write(f"title: {title}\n")
-
-            f.write(content)
+        # write the title followed by the existing content to a new file, copied in chunks, and swap it in
+        tmp_path = md_file + ".tmp"
+        with open(md_file, "rb") as src, open(tmp_path, "wb") as dst:
+            dst.write(f"title: {title}\n".encode())
+            shutil.copyfileobj(src, dst, length=1 << 20)
+        os.replace(tmp_path, md_file)
 
         print(f"Title added to {filename}")
         print()
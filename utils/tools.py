@@ -1,6 +1,10 @@
+import datetime
 import os
+import threading
 import zlib
 
+import orjson
+
 def create_folder(*args: str, is_full=False):
     if is_full:
         os.makedirs(*args, exist_ok=True)
@@ -9,14 +13,15 @@ def create_folder(*args: str, is_full=False):
 
 def generate_hash_filename(url):
     """Generate a hash of the URL to use as a filename."""
-    url_hash = zlib.crc32(url.encode())
-    file_name = f"{url_hash:x}"
-    return file_name
+    # CRC32 keeps names identical to earlier crawls, which incremental runs match on
+    return f"{zlib.crc32(url.encode()):x}"
 
-def get_files(path_dir, ignored=""):
-    """Get all files in a directory"""
+def get_files(path_dir, ignored="", extensions=None):
+    """Get all files in a directory, optionally only those ending with the given extension(s)"""
     all_files = []
     for root, dirs, files in os.walk(path_dir):
+        if extensions:
+            files = [file for file in files if file.endswith(extensions)]
         all_files += [os.path.join(root, file) for file in files]
 
     # ignore files with the ignored string
@@ -27,4 +32,36 @@ def get_files(path_dir, ignored=""):
 def get_domain(url):
     """Get the domain from a URL."""
     domain = url.split("//")[-1].split("/")[0]
-    return domain
\ No newline at end of file
+    return domain
+
+class DetailedLogger:
+    """Appends JSON lines to the detailed pipeline log through a single buffered file handle.
+
+    Entries without a "timestamp" are stamped when they are emitted. Use it as a context manager so
+    the buffer is flushed and the file closed when a stage ends. Without a log path every entry is
+    dropped.
+    """
+
+    def __init__(self, detailed_log_path):
+        # Owned by the logger for its whole life and closed by close() / __exit__
+        self._file = open(detailed_log_path, "ab", buffering=1 << 16) if detailed_log_path else None  # noqa: SIM115
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def emit(self, log_entry):
+        if self._file is not None:
+            if "timestamp" not in log_entry:
+                log_entry = {"timestamp": datetime.datetime.now().isoformat(), **log_entry}
+            line = orjson.dumps(log_entry) + b"\n"
+            with self._lock:
+                self._file.write(line)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None